@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import logging
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+from importlib.machinery import SourceFileLoader
+from multiprocessing import Pool
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+sys.path.append(os.path.join(ROOT, 'tests', 'helpers'))
+
+from corpus import generate_corpus
+from stub_server import StubServer, crossref_record, arxiv_entry
+
+STAGES = ['load', 'pages_to_text', 'find_in_text', 'find_in_metadata', 'rename', 'driver', 'driver_parallel']
+
+# prem modules are imported in main(), once the environment points them at the stub server
+PDF = CrossRef = BibWriter = cache = profile = queue_logging = init_worker = prem_cli = None
+driver_kwargs = {}
+
+def percentile(values, p):
+    """
+    Nearest rank percentile
+    """
+    values = sorted(values)
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+def copy_corpus(files, directory):
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+    return list(map(lambda f: shutil.copy(f, directory), files))
+
+def bench_load(fname):
+    PDF(fname).unload()
+
+def bench_pages_to_text(fname):
+    pdf = PDF(fname, engine=driver_kwargs['engine'])
+    pdf.pages_to_text()
+    pdf.unload()
+
+def bench_find_in_text(fname):
+    pdf = PDF(fname, engine=driver_kwargs['engine'])
+    pdf.find_in_text(CrossRef.identifier_regex_compiled)
+    pdf.unload()
+
+def bench_find_in_metadata(fname):
+    pdf = PDF(fname)
+    pdf.find_in_metadata(CrossRef.identifier_regex_compiled)
+    pdf.unload()
+
+def bench_rename(fname):
+    pdf = PDF(fname, incremental=not driver_kwargs['full_rewrite'])
+    pdf.update_metadata({'dc:title': 'Renamed by the benchmark'})
+    pdf.rename(fname + '.renamed.pdf')
+    pdf.unload()
+
+def bench_driver(fname):
+    return (fname, *prem_cli.driver(fname, **driver_kwargs))
+
+def timed(func, fname):
+    """
+    Seconds spent in func(fname), and its result
+    """
+    start = time.perf_counter()
+    result = func(fname)
+    return time.perf_counter() - start, result
+
+def timed_driver(fname):
+    return timed(bench_driver, fname)
+
+def run_stage(stage, files, workdir, workers, name_template):
+    """
+    Run a stage over all files and return (wall time, per file times).
+    Stages modifying files run on a fresh copy of the corpus, and the driver
+    stages start from an empty metadata cache so that every file hits the stub server.
+    """
+    if stage in ['rename', 'driver', 'driver_parallel']:
+        files = copy_corpus(files, os.path.join(workdir, stage))
+    if stage.startswith('driver'):
+        cache.clear()
+        driver_kwargs['name_template'] = os.path.join(workdir, stage, name_template)
+
+    start = time.perf_counter()
+    if stage == 'driver_parallel':
+        driver_kwargs['parallel'] = True
+        with queue_logging() as log_queue, Pool(workers, init_worker, (log_queue,)) as pool:
+            results = list(pool.imap_unordered(timed_driver, files))
+            pool.close()
+            pool.join()
+        driver_kwargs['parallel'] = False
+    else:
+        func = globals()[f"bench_{stage}"]
+        results = list(map(lambda f: timed(func, f), files))
+
+    if stage.startswith('driver'):
+        with BibWriter(os.path.join(workdir, f"{stage}.bib")) as bib_writer:
+            for _, (fname, entry, spans) in results:
+                bib_writer.add(entry)
+                profile.report.add(fname, spans)
+    return time.perf_counter() - start, list(map(lambda r: r[0], results))
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark prem stages on a synthetic corpus against a local metadata stub server")
+    ap.add_argument("-n", "--files", type=int, default=50, help="Number of pdfs in the corpus")
+    ap.add_argument("--pages", type=int, nargs=2, default=[1, 30], metavar=('MIN', 'MAX'), help="Range of page counts")
+    ap.add_argument("--lines", type=int, default=50, help="Lines of filler text per page")
+    ap.add_argument("--padding-kb", type=int, nargs=2, default=[0, 0], metavar=('MIN', 'MAX'), help="Range of extra kilobytes per file")
+    ap.add_argument("--seed", type=int, default=0, help="Corpus seed. The same seed gives the same corpus.")
+    ap.add_argument("--latency", type=float, default=0.05, help="Seconds the stub server waits before each response")
+    ap.add_argument("--stages", nargs='+', choices=STAGES, default=STAGES)
+    ap.add_argument("--workers", type=int, default=os.cpu_count(), help="Processes for the driver_parallel stage")
+    ap.add_argument("--json", help="Also write the results to this file, e.g. to compare runs")
+    ap.add_argument("--keep", action='store_true', help="Keep the working directory")
+    ap.add_argument("-v", "--verbose", action='store_true', help="Show prem's output")
+    ap.add_argument("prem_args", nargs=argparse.REMAINDER, help="Extra arguments for the driver stages, after --")
+    args = ap.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='prem-bench-')
+    json_file = os.path.abspath(args.json) if args.json else None
+
+    corpus = generate_corpus(os.path.join(workdir, 'corpus'), args.files, args.seed, tuple(args.pages), args.lines, padding_kb=tuple(args.padding_kb))
+    files = [ f for f, _ in corpus ]
+    records = { ids['doi']: crossref_record(ids['doi'], title=f"Paper {i}") for i, (_, ids) in enumerate(corpus) if 'doi' in ids }
+    arxiv_records = { ids['arxiv']: arxiv_entry(ids['arxiv'], title=f"Paper {i}") for i, (_, ids) in enumerate(corpus) if 'arxiv' in ids }
+
+    with StubServer(records, arxiv_records, latency=args.latency) as stub:
+        os.environ['PREM_CROSSREF_API'] = stub.url
+        os.environ['PREM_ARXIV_API'] = f"{stub.url}/api/query"
+        os.environ['PREM_DOI_RESOLVER'] = stub.url
+        os.environ['PREM_CACHE_DIR'] = os.path.join(workdir, 'cache')
+        # prem.log is written to the working directory
+        os.chdir(workdir)
+
+        global PDF, CrossRef, BibWriter, cache, profile, queue_logging, init_worker, prem_cli
+        from prem import PDF, profile
+        from prem.bibtex import BibWriter
+        from prem.sources import CrossRef, arXiv
+        from prem.cache import cache
+        from prem.logging import shell_handler, queue_logging, init_worker
+        prem_cli = SourceFileLoader('prem_cli', os.path.join(ROOT, 'bin', 'prem')).load_module()
+
+        # The stub server doesn't need the 3 second spacing asked by arXiv
+        arXiv.spacer.interval = 0
+        if not args.verbose:
+            shell_handler.setLevel(logging.CRITICAL)
+
+        prem_args = [ a for a in args.prem_args if a != '--' ]
+        driver_kwargs.update(vars(prem_cli.argument_parser().parse_args(['-a', '-b', os.path.join(workdir, 'driver.bib')] + prem_args)))
+        name_template = driver_kwargs['name_template']
+        # `-- --profile` breaks the driver stages down per prem stage
+        if driver_kwargs['profile'] or driver_kwargs['profile_trace']:
+            profile.enable()
+        if driver_kwargs['profile_trace']:
+            profile.report.open_trace(driver_kwargs['profile_trace'])
+
+        results = {}
+        for stage in args.stages:
+            wall, durations = run_stage(stage, files, workdir, args.workers, name_template)
+            results[stage] = {
+                    'files': len(durations),
+                    'files_per_sec': len(durations) / wall,
+                    'p50_ms': 1000 * percentile(durations, 50),
+                    'p95_ms': 1000 * percentile(durations, 95),
+                    }
+        requests = len(stub.requests)
+
+    pages = sum(map(lambda f: len(PDF(f).pages), files))
+    print(f"{len(files)} files, {pages} pages, stub latency {1000 * args.latency:.0f} ms, {requests} stub requests")
+    print(f"{'stage':<18} {'files':>6} {'files/s':>10} {'p50 ms':>10} {'p95 ms':>10}")
+    for stage, r in results.items():
+        print(f"{stage:<18} {r['files']:>6} {r['files_per_sec']:>10.1f} {r['p50_ms']:>10.2f} {r['p95_ms']:>10.2f}")
+
+    if profile.enabled:
+        print()
+        print('\n'.join(profile.report.table()))
+        profile.report.close()
+
+    if json_file:
+        with open(json_file, 'w') as fp:
+            json.dump({'files': len(files), 'pages': pages, 'latency': args.latency, 'stages': results}, fp, indent=2)
+
+    if args.keep:
+        print(f"Working directory: {workdir}")
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
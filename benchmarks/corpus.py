@@ -0,0 +1,97 @@
+import os
+import random
+from pikepdf import Pdf, Dictionary, Name
+
+WORDS = """the of and a to in is that for on with as by this are be from an it at which we
+model data results method field energy system analysis theory paper using time large
+study observed between these two function state results process phase structure""".split()
+
+PLACEMENTS = ['first', 'last', 'metadata', 'arxiv', 'none']
+XMP_STATES = ['none', 'plain', 'identifier']
+
+def filler(rng, n_lines, words_per_line=12):
+    return [ ' '.join(rng.choice(WORDS) for _ in range(words_per_line)) for _ in range(n_lines) ]
+
+def page_stream(lines, stamp=None):
+    """
+    Content stream writing lines top to bottom, and an optional arXiv style stamp
+    rotated along the left margin
+    """
+    ops = ["BT /F1 10 Tf 12 TL 72 750 Td"]
+    ops.extend(f"({line}) '" for line in lines)
+    ops.append("ET")
+    if stamp:
+        ops.append(f"BT /F1 20 Tf 0 1 -1 0 32 200 Tm ({stamp}) Tj ET")
+    return '\n'.join(ops).encode()
+
+def make_corpus_pdf(filename, seed, n_pages, lines_per_page=50, placement='first', xmp='plain', padding_kb=0):
+    """
+    Build a pdf with filler text and an identifier placed according to `placement`:
+    in the text of the first or last page, in the document info and XMP metadata,
+    as an arXiv margin stamp on the first page, or nowhere.
+
+    `xmp` is 'none' (no XMP packet), 'plain' (title only) or 'identifier' (title and DOI).
+    `padding_kb` adds an unused image of random bytes to grow the file.
+    Returns the identifiers written to the file: {'doi': ..., 'arxiv': ...}
+    """
+    rng = random.Random(seed)
+    doi = f"10.{rng.randint(1000, 9999)}/bench.{seed}"
+    arxiv_id = f"{rng.randint(1001, 2312)}.{rng.randint(10000, 99999)}"
+    ids = {}
+
+    pdf = Pdf.new()
+    font = pdf.make_indirect(Dictionary(Type=Name.Font, Subtype=Name.Type1, BaseFont=Name.Helvetica))
+    for index in range(n_pages):
+        lines = filler(rng, lines_per_page)
+        stamp = None
+        if placement == 'first' and index == 0 or placement == 'last' and index == n_pages - 1:
+            lines.insert(rng.randrange(len(lines)), f"DOI {doi}")
+            ids['doi'] = doi
+        if placement == 'arxiv' and index == 0:
+            stamp = f"arXiv:{arxiv_id}v1 [hep-th] 1 Jan 2021"
+            ids['arxiv'] = arxiv_id
+
+        page = pdf.add_blank_page(page_size=(612, 792))
+        page.Resources = Dictionary(Font=Dictionary(F1=font))
+        page.Contents = pdf.make_stream(page_stream(lines, stamp))
+
+    if padding_kb:
+        image = pdf.make_stream(rng.getrandbits(padding_kb * 8192).to_bytes(padding_kb * 1024, 'little'), Type=Name.XObject, Subtype=Name.Image,
+                                Width=1024, Height=padding_kb, ColorSpace=Name.DeviceGray, BitsPerComponent=8)
+        pdf.pages[0].Resources.XObject = Dictionary(Im0=image)
+
+    if placement == 'metadata':
+        pdf.docinfo['/Subject'] = f"doi:{doi}"
+        ids['doi'] = doi
+
+    if xmp != 'none':
+        with pdf.open_metadata(set_pikepdf_as_editor=False) as meta:
+            meta['dc:title'] = ' '.join(filler(rng, 1, 6))
+            if xmp == 'identifier' or placement == 'metadata':
+                meta['dc:identifier'] = f"doi:{doi}"
+                ids['doi'] = doi
+
+    pdf.save(filename)
+    return ids
+
+def generate_corpus(directory, n_files, seed=0, pages=(1, 30), lines_per_page=50, placements=PLACEMENTS, xmp_states=XMP_STATES, padding_kb=(0, 0)):
+    """
+    Build n_files pdfs in directory with page counts, identifier placements, XMP states and
+    padding drawn from the given ranges. The same seed gives the same corpus.
+    Returns a list of (filename, identifiers) pairs.
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+
+    corpus = []
+    for i in range(n_files):
+        filename = os.path.join(directory, f"{i:05d}.pdf")
+        ids = make_corpus_pdf(filename,
+                              seed=rng.randrange(2**32),
+                              n_pages=rng.randint(*pages),
+                              lines_per_page=lines_per_page,
+                              placement=rng.choice(placements),
+                              xmp=rng.choice(xmp_states),
+                              padding_kb=rng.randint(*padding_kb))
+        corpus.append((filename, ids))
+    return corpus
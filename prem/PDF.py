@@ -1,28 +1,56 @@
-import pdfplumber
+import codecs
 import os
-from pikepdf import Pdf, Name
-import pikepdf.objects as pdfobj
+import time
+from collections import defaultdict
 import re
+import shutil
 from pathlib import Path
 from prem.logging import defaultLogger
+from prem.utils import move_without_overwriting
+from prem.engines import ENGINES, DEFAULT_ENGINE
+from prem import profile
 
 class PDF:
     doi_regex = r'10\.\d{4,9}/[A-Za-z0-9./:;()\-_]+'
     doi_regex_compiled = re.compile(doi_regex)
 
+    # Adaptive page budget for identifier searches: one page per `scan_pages_per_page_budget`
+    # pages of the document, within [scan_min_pages, scan_max_pages]
+    scan_min_pages = 3
+    scan_max_pages = 10
+    scan_pages_per_page_budget = 20
+
+    # Identifier kind searched for on the last page (publisher footers) when the front pages have none
+    scan_last_page_kind = 'doi'
+
     filename: str
     name_template:str
+    incremental:bool
 
-    def __init__(self, filename=None, name_template="{year} - {author} - {title}.pdf", logger=None):
+    def __init__(self, filename=None, name_template="{year} - {author} - {title}.pdf", logger=None, incremental=True, engine=DEFAULT_ENGINE):
         self.filename = filename
-        self.metadata = {}
+        self.incremental = incremental
+        self.engine = engine
+        self._metadata = {}
+        self.metadata_updates = {}
         self.pages = None
+        self.texts = {}
+        self.engines = {}
+        # engine -> [pages extracted, seconds spent]
+        self.extraction_times = defaultdict(lambda: [0, 0.0])
         self.name_template = name_template
         self.pdf = None
+        self.repaired = False
         self.logger = logger or defaultLogger
 
         self.load()
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.unload()
+
     def __del__(self):
         self.unload()
 
@@ -32,40 +60,150 @@ class PDF:
         if not filename:
             return
 
-        self.pdf = Pdf.open(filename, allow_overwriting_input=True)
-        self.metadata = self.pdf.open_metadata()
-        self.metadata._updating = True
-        self.metadata.register_xml_namespace('https://github.com/jayghoshter/prem', 'prem')
+        # Imported on first use, so that commands not reading pdfs start faster
+        import pikepdf
+        with profile.span('pdf.open'):
+            self.pdf = pikepdf.Pdf.open(filename)
+        # Warnings on open mean that the cross-reference table had to be reconstructed
+        self.repaired = bool(self.pdf.get_warnings())
+        # XMP metadata is parsed on first access, identifier searches read the raw packet
+        self._metadata = None
         self.pages = self.pdf.pages
 
+    @property
+    def metadata(self):
+        if self._metadata is None:
+            self._metadata = self.parse_metadata()
+        return self._metadata
+
+    @metadata.setter
+    def metadata(self, value):
+        self._metadata = value
+
+    @profile.profiled('pdf.xmp')
+    def parse_metadata(self):
+        metadata = self.pdf.open_metadata()
+        metadata._updating = True
+        metadata.register_xml_namespace('https://github.com/jayghoshter/prem', 'prem')
+
         # Fix for malformed XML metadata
         try: 
-            for k,v in self.metadata.items():
+            for k,v in metadata.items():
                 pass
         except KeyError as e: 
             from lxml import etree as ET
-            root = ET.fromstring(str(self.metadata))
+            root = ET.fromstring(str(metadata))
             out = root.find(f'.//{e.args[0]}')
             outp = out.getparent()
             outp.remove(out)
-            self.metadata._load_from(bytes(ET.tostring(root)))
+            metadata._load_from(bytes(ET.tostring(root)))
+
+        return metadata
 
     def update_metadata(self, indict):
+        self.metadata_updates.update(indict)
         self.metadata.update(indict)
         self.metadata._apply_changes()
 
+    @profile.profiled('pdf.save')
     def write(self, filename=None):
-        if filename: 
-            Path(filename).parent.mkdir(parents=True, exist_ok=True)
-        self.pdf.save(filename)
+        """
+        Save the whole document, by default over the input file. pikepdf reads objects from
+        the input while saving, so it is replaced by a temporary file written next to it.
+        """
+        filename = str(filename or self.filename)
+        Path(filename).parent.mkdir(parents=True, exist_ok=True)
+        if not (os.path.exists(filename) and os.path.samefile(filename, self.filename)):
+            self.pdf.save(filename)
+            return
+
+        temporary = f"{filename}.prem-save"
+        try:
+            self.pdf.save(temporary)
+            shutil.copymode(filename, temporary)
+            os.replace(temporary, filename)
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+
+    @profile.profiled('pdf.save_incremental')
+    def write_incremental(self):
+        """
+        Append the catalog, XMP metadata and document info objects to the end
+        of the file as a PDF incremental update. Nothing else is rewritten, so
+        the cost depends on the size of the metadata, not of the document.
+        """
+        import pikepdf
+        objects = [self.pdf.Root, self.pdf.Root.Metadata, self.pdf.docinfo]
+        size, prev = self.last_xref()
+
+        offsets = {}
+        out = b'\n'
+        for obj in sorted(objects, key=lambda o: o.objgen):
+            num, gen = obj.objgen
+            offsets[num] = (size + len(out), gen)
+            out += f"{num} {gen} obj\n".encode()
+            if isinstance(obj, pikepdf.Stream):
+                data = obj.read_bytes()
+                out += f"<< /Type /Metadata /Subtype /XML /Length {len(data)} >>\nstream\n".encode()
+                out += data + b'\nendstream'
+            else:
+                out += obj.unparse(resolved=True)
+            out += b'\nendobj\n'
+
+        xref_offset = size + len(out)
+        out += b'xref\n'
+        for num, (offset, gen) in sorted(offsets.items()):
+            out += f"{num} 1\n{offset:010d} {gen:05d} n \n".encode()
+
+        trailer = pikepdf.Dictionary(
+                Size=max(int(self.pdf.trailer.Size), max(offsets) + 1),
+                Root=self.pdf.Root,
+                Info=self.pdf.docinfo,
+                Prev=int(prev),
+                )
+        if pikepdf.Name.ID in self.pdf.trailer:
+            trailer.ID = self.pdf.trailer.ID
+
+        out += b'trailer\n' + trailer.unparse() + f"\nstartxref\n{xref_offset}\n%%EOF\n".encode()
+
+        with open(self.filename, 'ab') as fp:
+            fp.write(out)
+
+    def last_xref(self):
+        """
+        Size of the file and offset of its last cross-reference section, or None if the file
+        doesn't end with one, e.g. with junk after %%EOF
+        """
+        with open(self.filename, 'rb') as fp:
+            fp.seek(0, os.SEEK_END)
+            size = fp.tell()
+            fp.seek(max(0, size - 2048))
+            match = re.search(rb'startxref\s+(\d+)\s+%%EOF\s*$', fp.read())
+        return size, (int(match.group(1)) if match else None)
+
+    def can_append(self):
+        """
+        Whether an incremental update can be appended: encrypted files would need their new
+        objects encrypted too, and the update of a repaired file would point at a broken
+        cross-reference table
+        """
+        return not self.pdf.is_encrypted and not self.repaired and self.last_xref()[1] is not None
 
     def rename(self, newname=None, name_template=None):
         if not newname:
             newname = self.strtemplate_to_str(name_template)
-        self.write(newname)
-        if str(self.filename) != str(newname): 
+
+        if self.incremental and self.can_append():
+            self.write_incremental()
+        else:
+            self.write(self.filename)
+
+        if str(self.filename) != str(newname):
+            Path(newname).parent.mkdir(parents=True, exist_ok=True)
+            with profile.span('pdf.move'):
+                newname = move_without_overwriting(self.filename, newname)
             self.logger.info(f"Renaming file to: [bold magenta]{newname}[/bold magenta]", indent_level=1)
-            os.remove(self.filename)
         self.filename = newname
 
     def match_metadata_fields(self, key, flags=0):
@@ -79,59 +217,145 @@ class PDF:
 
         return matches
 
+    def metadata_bytes(self):
+        """
+        Yield (where, bytes) for the raw XMP packet and each string in the document info.
+        Nothing is parsed or converted per key.
+        """
+        import pikepdf
+        if pikepdf.Name.Metadata in self.pdf.Root:
+            yield 'xmp', self.pdf.Root.Metadata.read_bytes()
+
+        for k,v in self.pdf.docinfo.items():
+            if isinstance(v, pikepdf.String):
+                data = bytes(v)
+                # Text strings may be UTF-16BE with a byte order mark
+                if data.startswith(codecs.BOM_UTF16_BE):
+                    data = data.decode('utf-16').encode('utf-8', 'ignore')
+                yield k, data
+
     def find_in_metadata(self, pattern, flags=0):
         if not self.pdf:
             return
 
         if isinstance(pattern, str):
-            compiled_pattern = re.compile(pattern, flags)
+            compiled_pattern = re.compile(pattern.encode(), flags)
         elif isinstance(pattern, re.Pattern):
-            compiled_pattern = pattern
+            compiled_pattern = pattern if isinstance(pattern.pattern, bytes) else re.compile(pattern.pattern.encode(), pattern.flags & ~re.UNICODE)
         else:
             raise TypeError("Bad pattern object")
 
         matches = []
-        res = []
-        search_spaces = [self.metadata, self.pdf.docinfo]
-
-        for ss in search_spaces:
-            for k,v in ss.items():
-                if isinstance(v, str):
-                    res = compiled_pattern.findall(v)
-                elif isinstance(v, list) or isinstance(v, set):
-                    res = compiled_pattern.findall(" ".join(str(v)))
-                elif isinstance(v, pdfobj.Object):
-                    try: 
-                        res = compiled_pattern.findall(str(v))
-                    except NotImplementedError:
-                        # When you can't str(v)
-                        pass
-                elif isinstance(v, int):
-                    res = compiled_pattern.findall(str(v))
-                elif v is None:
-                    pass
-                else:
-                    raise RuntimeError(f"Unknown metadata value type!\n{k}: {v} => {type(v)}")
-                matches.extend(res)
-
-        return list(set(matches))
+        for _, data in self.metadata_bytes():
+            matches.extend(compiled_pattern.findall(data))
+
+        return list(set(map(lambda m: m.decode('utf-8', 'replace'), matches)))
+
+    def find_hits_in_metadata(self, matcher, kinds=None):
+        """
+        Search the raw metadata once for all identifier kinds of matcher
+        """
+        if not self.pdf:
+            return []
+
+        hits = []
+        with profile.span('match.metadata'):
+            for where, data in self.metadata_bytes():
+                hits.extend(matcher.finditer(data, where, kinds))
+        return hits
 
     def unload(self):
+        """
+        Close the document and the extraction engines, and drop everything read from them.
+        Safe to call more than once.
+        """
         self.metadata = {}
         self.pages = None
+        self.texts = {}
+        for engine in self.engines.values():
+            engine.close()
+        self.engines = {}
         if self.pdf:
             self.pdf.close()
+            self.pdf = None
+
+    @property
+    def page_texts(self):
+        """
+        Page index -> text extracted so far with the default engine
+        """
+        return self.texts.setdefault(self.engine, {})
+
+    def open_engine(self, engine):
+        """
+        The extraction engine, opening the document with it on first use
+        """
+        if engine not in self.engines:
+            with profile.span(f"extract.{engine}.open"):
+                self.engines[engine] = ENGINES[engine](self)
+        return self.engines[engine]
+
+    def guess_title(self):
+        """
+        A likely title: the largest text on the first page, read with pdfplumber
+        """
+        if not self.pages:
+            return ''
+        with profile.span('extract.title'):
+            return self.open_engine('pdfplumber').largest_text(0)
+
+    def page_to_text(self, index, engine=None):
+        """
+        Return the text of a single page, extracting it only on first access.
+        Each extraction engine opens the document once and keeps it around for later pages.
+        """
+        engine = engine or self.engine
+        page_texts = self.texts.setdefault(engine, {})
 
-    def pages_to_text(self, n=None):
-        pdf = pdfplumber.open(self.filename)
-        pages = pdf.pages[:n]
+        if index not in page_texts:
+            start = time.perf_counter()
+            with profile.span(f"extract.{engine}", page=index):
+                page_texts[index] = self.open_engine(engine).page_text(index)
+            self.extraction_times[engine][0] += 1
+            self.extraction_times[engine][1] += time.perf_counter() - start
+        return page_texts[index]
+
+    def pages_to_text(self, n=None, engine=None):
         text = ''
-        for page in pages:
-            text = text + '\n' +  page.extract_text()
-        pdf.close()
+        for index in range(len(self.pages))[:n]:
+            text = text + '\n' + self.page_to_text(index, engine)
         return text
 
-    def find_in_text(self, pattern, flags=0, n_pages=3, mod=None):
+    def scan_order(self, n_pages=None):
+        """
+        Page indices in the order they should be searched for identifiers.
+
+        The first page comes first: it usually carries the DOI and the arXiv margin stamp.
+        With an explicit n_pages, the first n_pages pages are searched. Otherwise the budget
+        grows with the length of the document. The last page only comes in as a fallback,
+        see last_page().
+        """
+        total = len(self.pages)
+        if n_pages is not None:
+            return list(range(total))[:n_pages]
+
+        budget = max(self.scan_min_pages, min(self.scan_max_pages, total // self.scan_pages_per_page_budget))
+        return list(range(total))[:budget]
+
+    def last_page(self, n_pages=None):
+        """
+        Index of the last page if it is searched after the pages of scan_order found nothing,
+        or None: with an explicit n_pages, or if it was searched already
+        """
+        total = len(self.pages)
+        if n_pages is None and total - 1 not in self.scan_order():
+            return total - 1
+
+    def find_in_text(self, pattern, flags=0, n_pages=None, mod=None):
+        """
+        Search the text page by page, extracting each page only when it is reached,
+        and stop at the first page with a match.
+        """
         if isinstance(pattern, str):
             compiled_pattern = re.compile(pattern, flags)
         elif isinstance(pattern, re.Pattern):
@@ -139,14 +363,44 @@ class PDF:
         else:
             raise TypeError("Bad pattern object")
 
-        text = self.pages_to_text(n_pages)
+        for index in self.scan_order(n_pages):
+            text = self.page_to_text(index)
+
+            # Apply a modification to the text
+            if mod:
+                text = mod(text)
+
+            if matches := compiled_pattern.findall(text):
+                return list(set(matches))
+
+        return []
+
+    def find_hits_in_text(self, matcher, kinds=None, n_pages=None):
+        """
+        Search the text page by page once for all identifier kinds of matcher.
+        Like find_in_text, the search stops at the first page with a hit of any kind,
+        and returns the hits of that page.
+
+        Failing that, the last page is searched for a DOI in a publisher footer. It is only
+        taken if it is the only DOI there: a reference list cites several papers.
+        """
+        kinds = set(kinds if kinds is not None else matcher.kinds)
 
-        # Apply a modification to the text
-        if mod:
-            text = mod(text)
+        for index in self.scan_order(n_pages):
+            text = self.page_to_text(index)
+            with profile.span('match.text'):
+                if hits := matcher.find(text, index, kinds):
+                    return hits
 
-        return list(set(compiled_pattern.findall(text)))
+        index = self.last_page(n_pages)
+        if index is not None and self.scan_last_page_kind in kinds:
+            text = self.page_to_text(index)
+            with profile.span('match.text'):
+                hits = matcher.find(text, index, {self.scan_last_page_kind})
+            if len(set(map(lambda h: h.value.lower(), hits))) == 1:
+                return hits
 
+        return []
 
     def strtemplate_to_str(self, strtemplate = None, mdata = None, ns_prefix = 'prem'):
         """
@@ -1,6 +1,11 @@
+import importlib
 
-from . import utils
-from .PDF import PDF
-
-from . import sources
-from . import logging
+# Submodules, and the PDF class, are imported on first access so that `import prem` stays cheap
+def __getattr__(name):
+    if name == 'PDF':
+        from .PDF import PDF
+        globals()['PDF'] = PDF
+        return PDF
+    if name in ['utils', 'sources', 'logging']:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
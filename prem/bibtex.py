@@ -0,0 +1,337 @@
+import fcntl
+import html
+import itertools
+import json
+import os
+import re
+import string
+import threading
+import xml.etree.ElementTree as ET
+from prem.logging import defaultLogger
+from prem.utils import fetch_bibliography, first_author_key
+
+MONTHS = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec']
+
+# CrossRef work types -> BibTeX entry types. Anything else is @misc.
+BIBTEX_TYPES = {
+        'journal-article': 'article',
+        'proceedings-article': 'inproceedings',
+        'book': 'book',
+        'monograph': 'book',
+        'edited-book': 'book',
+        'book-chapter': 'incollection',
+        'dissertation': 'phdthesis',
+        'report': 'techreport',
+        }
+
+# CrossRef work types -> CSL types. Anything else is 'article'.
+CSL_TYPES = {
+        'journal-article': 'article-journal',
+        'proceedings-article': 'paper-conference',
+        'book': 'book',
+        'monograph': 'book',
+        'edited-book': 'book',
+        'book-chapter': 'chapter',
+        'dissertation': 'thesis',
+        'report': 'report',
+        'dataset': 'dataset',
+        }
+
+ARXIV_NAMESPACES = {'atom': "http://www.w3.org/2005/Atom"}
+
+FORMATS = ['bibtex', 'csl-json']
+
+def bib_format(filename, fmt=None):
+    """
+    The given format, or the one matching the extension of filename
+    """
+    return fmt or ('csl-json' if str(filename).lower().endswith('.json') else 'bibtex')
+
+def clean(value):
+    """
+    Strip markup from CrossRef strings and escape the characters BibTeX chokes on
+    """
+    value = html.unescape(re.sub(r'<[^>]+>', '', str(value)))
+    return re.sub(r'\s+', ' ', re.sub(r'([&%#])', r'\\\1', value)).strip()
+
+def first(values):
+    return values[0] if values else ''
+
+def crossref_first_author(mdata):
+    authors = mdata.get('author') or []
+    return next(filter(lambda a: a.get('sequence') == 'first', authors), first(authors))
+
+def crossref_year(mdata):
+    for field in ['issued', 'published-print', 'published-online', 'created']:
+        parts = (mdata.get(field) or {}).get('date-parts') or [[None]]
+        if parts[0] and parts[0][0]:
+            return parts[0]
+    return []
+
+def render_fields(entry_type, key, fields):
+    fields = ', '.join(f"{name}={value}" if name == 'month' else f"{name}={{{value}}}" for name, value in fields if value)
+    return f"@{entry_type}{{{key}, {fields}}}\n"
+
+def crossref_to_bibtex(mdata):
+    """
+    Render a CrossRef works record as a BibTeX entry in the style of dx.doi.org,
+    including prem's first author key prefix.
+    """
+    date = crossref_year(mdata)
+    year = date[0] if date else ''
+    author = crossref_first_author(mdata)
+    key = re.sub(r'\s+', '_', f"{author.get('family', author.get('name', 'Anonymous'))}_{year}")
+
+    authors = ' and '.join(map(lambda a: clean(f"{a['family']}, {a['given']}" if a.get('given') else a.get('family', a.get('name', ''))), mdata.get('author') or []))
+
+    fields = [
+            ('title', clean(first(mdata.get('title')))),
+            ('volume', mdata.get('volume')),
+            ('ISSN', first(mdata.get('ISSN'))),
+            ('url', f"http://dx.doi.org/{mdata['DOI']}"),
+            ('DOI', mdata['DOI']),
+            ('number', mdata.get('issue')),
+            ('journal' if mdata.get('type') == 'journal-article' else 'booktitle', clean(first(mdata.get('container-title')))),
+            ('publisher', clean(mdata.get('publisher', ''))),
+            ('author', authors),
+            ('year', year),
+            ('month', MONTHS[date[1] - 1] if len(date) > 1 and date[1] else None),
+            ('pages', mdata.get('page')),
+            ]
+
+    return first_author_key(render_fields(BIBTEX_TYPES.get(mdata.get('type'), 'misc'), key, fields))
+
+def crossref_to_csl(mdata):
+    """
+    Render a CrossRef works record as a CSL-JSON item
+    """
+    authors = list(map(lambda a: {'family': a['family'], 'given': a.get('given', '')} if 'family' in a else {'literal': a.get('name', '')},
+                       mdata.get('author') or []))
+    date = crossref_year(mdata)
+    item = {
+            'id': mdata['DOI'],
+            'type': CSL_TYPES.get(mdata.get('type'), 'article'),
+            'title': clean(first(mdata.get('title'))).replace('\\', ''),
+            'container-title': clean(first(mdata.get('container-title'))).replace('\\', ''),
+            'author': authors,
+            'issued': {'date-parts': [date]} if date else None,
+            'DOI': mdata['DOI'],
+            'URL': mdata.get('URL'),
+            'volume': mdata.get('volume'),
+            'issue': mdata.get('issue'),
+            'page': mdata.get('page'),
+            'publisher': mdata.get('publisher'),
+            'ISSN': first(mdata.get('ISSN')),
+            }
+    return { k: v for k, v in item.items() if v }
+
+def arxiv_entry_fields(root:ET.Element):
+    entry = root.find('atom:entry', ARXIV_NAMESPACES)
+    if entry is None:
+        return None
+    arxiv_id = re.sub("https?://arxiv.org/abs/", '', entry.findtext('atom:id', '', ARXIV_NAMESPACES))
+    authors = list(map(lambda a: a.text.split(), entry.findall('atom:author/atom:name', ARXIV_NAMESPACES)))
+    return {
+            'id': arxiv_id,
+            'title': re.sub(r'\s+', ' ', entry.findtext('atom:title', '', ARXIV_NAMESPACES)).strip(),
+            'authors': list(map(lambda a: (a[-1], ' '.join(a[:-1])), authors)),
+            'date': list(map(int, entry.findtext('atom:published', '', ARXIV_NAMESPACES)[:10].split('-'))),
+            }
+
+def arxiv_to_bibtex(root:ET.Element):
+    """
+    Render an arXiv API feed entry as a BibTeX @misc entry
+    """
+    fields = arxiv_entry_fields(root)
+    if not fields:
+        return ''
+    family = fields['authors'][0][0] if fields['authors'] else 'Anonymous'
+    key = f"{family}_{fields['date'][0]}"
+    return render_fields('misc', key, [
+            ('title', clean(fields['title'])),
+            ('url', f"https://arxiv.org/abs/{fields['id']}"),
+            ('author', ' and '.join(map(lambda a: clean(f"{a[0]}, {a[1]}" if a[1] else a[0]), fields['authors']))),
+            ('year', fields['date'][0]),
+            ('eprint', re.sub(r'v\d+$', '', fields['id'])),
+            ('archivePrefix', 'arXiv'),
+            ])
+
+def arxiv_to_csl(root:ET.Element):
+    """
+    Render an arXiv API feed entry as a CSL-JSON item
+    """
+    fields = arxiv_entry_fields(root)
+    if not fields:
+        return None
+    arxiv_id = re.sub(r'v\d+$', '', fields['id'])
+    return {
+            'id': f"arXiv:{arxiv_id}",
+            'type': 'article',
+            'title': fields['title'],
+            'author': list(map(lambda a: {'family': a[0], 'given': a[1]}, fields['authors'])),
+            'issued': {'date-parts': [fields['date']]},
+            'URL': f"https://arxiv.org/abs/{fields['id']}",
+            'number': arxiv_id,
+            'publisher': 'arXiv',
+            }
+
+def bibliography(doi=None, arxiv_id=None, fmt='bibtex', logger=None):
+    """
+    Render the bibliography entry for a DOI or an arXiv id from the metadata already
+    held in the CrossRef dump index or the metadata cache (fetching it if needed).
+    A BibTeX entry for a DOI falls back to dx.doi.org if no record can be rendered.
+    Returns a string for BibTeX, a dict for CSL-JSON, or None.
+    """
+    # Imported here: the sources import prem.utils, which doesn't need them
+    from prem.sources import CrossRefDump, arXiv
+    logger = logger or defaultLogger
+
+    if doi:
+        try:
+            mdata = CrossRefDump.fetch_by_doi(doi)
+        except RuntimeError as e:
+            logger.warning(str(e), indent_level=1)
+            mdata = None
+        if mdata:
+            return crossref_to_bibtex(mdata) if fmt == 'bibtex' else crossref_to_csl(mdata)
+        if fmt == 'bibtex':
+            logger.warning("Couldn't render bibtex from metadata. Fetching it from dx.doi.org", indent_level=1)
+            return fetch_bibliography(doi) or None
+    elif arxiv_id:
+        root = arXiv.fetch_metadata_arxiv(arxiv_id)
+        return (arxiv_to_bibtex(root) or None) if fmt == 'bibtex' else arxiv_to_csl(root)
+
+    return None
+
+ENTRY_REGEX = re.compile(r'@(\w+)\s*\{\s*([^,\s]+)\s*,')
+
+def entry_identifier(entry):
+    """
+    The DOI or arXiv id of a BibTeX or CSL-JSON entry, e.g. 'doi:10.1103/physrevd.13.191'
+    """
+    if isinstance(entry, dict):
+        if entry.get('DOI'):
+            return f"doi:{entry['DOI'].strip().lower()}"
+        if str(entry.get('id', '')).startswith('arXiv:'):
+            return entry['id'].lower()
+        return None
+    if match := re.search(r'\bDOI\s*=\s*\{([^}]*)\}', entry, re.IGNORECASE):
+        return f"doi:{match.group(1).strip().lower()}"
+    if match := re.search(r'\beprint\s*=\s*\{([^}]*)\}', entry, re.IGNORECASE):
+        return f"arxiv:{match.group(1).strip().lower()}"
+    return None
+
+def entry_key(entry):
+    if isinstance(entry, dict):
+        return str(entry.get('id', ''))
+    match = ENTRY_REGEX.search(entry)
+    return match.group(2) if match else ''
+
+def with_key(entry, key):
+    if isinstance(entry, dict):
+        return {**entry, 'id': key}
+    return ENTRY_REGEX.sub(lambda m: f"@{m.group(1)}{{{key},", entry, count=1)
+
+def key_suffixes():
+    """
+    a, b, ..., z, aa, ab, ...
+    """
+    for length in itertools.count(1):
+        for letters in itertools.product(string.ascii_lowercase, repeat=length):
+            yield ''.join(letters)
+
+class BibWriter:
+    """
+    Collect bibliography entries from all workers and append the new ones to a
+    BibTeX or CSL-JSON file.
+
+    - The existing file is indexed by DOI/arXiv id and citation key, and entries for
+      papers already in it, or already collected, are dropped.
+    - Entries are written on flush() in one locked write, sorted by citation key and
+      identifier, so the result doesn't depend on the order workers finish in.
+    - A key that is already taken by another paper gets the first free suffix: a, b, ...
+    """
+
+    def __init__(self, filename, fmt=None):
+        self.filename = filename
+        self.fmt = bib_format(filename, fmt)
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.index(self.read())
+
+    def read(self):
+        if not os.path.isfile(self.filename):
+            return ''
+        with open(self.filename, encoding='utf-8') as fp:
+            return fp.read()
+
+    def parse(self, text):
+        if self.fmt == 'csl-json':
+            return json.loads(text) if text.strip() else []
+        starts = [ m.start() for m in ENTRY_REGEX.finditer(text) ]
+        return [ text[a:b] for a, b in zip(starts, starts[1:] + [len(text)]) ]
+
+    def index(self, text):
+        entries = self.parse(text)
+        self.keys = set(map(entry_key, entries))
+        self.identifiers = set(filter(None, map(entry_identifier, entries)))
+
+    def add(self, entry):
+        """
+        Collect an entry unless its paper is already in the file or collected.
+        Returns True if it was collected.
+        """
+        if not entry:
+            return False
+        identifier = entry_identifier(entry)
+        with self.lock:
+            if identifier in self.identifiers or identifier in self.pending:
+                return False
+            # Entries without an identifier can't be matched, keep them all
+            self.pending[identifier or f"entry:{len(self.pending)}"] = entry
+            return True
+
+    def unique_key(self, key):
+        if key not in self.keys:
+            return key
+        return next(key + suffix for suffix in key_suffixes() if key + suffix not in self.keys)
+
+    def flush(self):
+        """
+        Append the collected entries that are still new. Returns the number written.
+        """
+        with self.lock, open(self.filename, 'a+', encoding='utf-8') as fp:
+            fcntl.flock(fp, fcntl.LOCK_EX)
+            # Another process may have written to the file since it was indexed
+            fp.seek(0)
+            text = fp.read()
+            self.index(text)
+
+            new = []
+            for identifier, entry in sorted(self.pending.items(), key=lambda item: (entry_key(item[1]), item[0])):
+                if identifier in self.identifiers:
+                    continue
+                key = self.unique_key(entry_key(entry))
+                self.keys.add(key)
+                self.identifiers.add(identifier)
+                new.append(with_key(entry, key))
+
+            if self.fmt == 'bibtex':
+                separator = '\n' if new and text and not text.endswith('\n') else ''
+                fp.write(separator + ''.join(new))
+            elif new:
+                fp.seek(0)
+                fp.truncate()
+                json.dump(self.parse(text) + new, fp, indent=2, ensure_ascii=False)
+            fp.flush()
+            os.fsync(fp.fileno())
+            fcntl.flock(fp, fcntl.LOCK_UN)
+
+            self.pending = {}
+            return len(new)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.flush()
@@ -0,0 +1,145 @@
+import json
+import os
+import time
+from functools import wraps
+from prem import profile
+from prem.sqlite import SQLiteStore
+
+CACHE_DIR = os.environ.get('PREM_CACHE_DIR') or f"{os.environ['HOME']}/.cache/prem"
+CACHE_FILE = f"{CACHE_DIR}/metadata.sqlite"
+
+POSITIVE_TTL = 90 * 24 * 3600
+NEGATIVE_TTL = 24 * 3600
+MAX_SIZE = 256 * 1024 * 1024
+
+# Check the size cap once every this many writes
+PRUNE_INTERVAL = 256
+
+class MetadataCache(SQLiteStore):
+    """
+    Cache of fetched metadata as JSON in an SQLite database, keyed by namespace and identifier.
+
+    - Entries expire after `positive_ttl` seconds, or `negative_ttl` for failed lookups.
+    - Least recently used entries are evicted when the total size exceeds `max_size` bytes.
+    - The database is in WAL mode, so pool workers can read and write concurrently.
+    """
+
+    def __init__(self, filename=CACHE_FILE, positive_ttl=POSITIVE_TTL, negative_ttl=NEGATIVE_TTL, max_size=MAX_SIZE):
+        super().__init__(filename)
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def setup(self, db):
+        db.execute('PRAGMA synchronous=NORMAL')
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                namespace TEXT,
+                key TEXT,
+                value TEXT,
+                negative INTEGER,
+                expires REAL,
+                accessed REAL,
+                size INTEGER,
+                PRIMARY KEY (namespace, key)
+            )""")
+        db.execute('CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)')
+
+    def get(self, namespace, key):
+        """
+        Return (True, value) for a valid cached entry, (False, None) otherwise
+        """
+        now = time.time()
+        row = self.db.execute('SELECT value FROM entries WHERE namespace = ? AND key = ? AND expires > ?',
+                              (namespace, key, now)).fetchone()
+        if not row:
+            self.misses += 1
+            return False, None
+
+        self.hits += 1
+        self.db.execute('UPDATE entries SET accessed = ? WHERE namespace = ? AND key = ?', (now, namespace, key))
+        return True, json.loads(row[0])
+
+    def contains(self, namespace, key):
+        return bool(self.db.execute('SELECT 1 FROM entries WHERE namespace = ? AND key = ? AND expires > ?',
+                                    (namespace, key, time.time())).fetchone())
+
+    def put(self, namespace, key, value, negative=False):
+        now = time.time()
+        data = json.dumps(value)
+        ttl = self.negative_ttl if negative else self.positive_ttl
+        self.db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)',
+                        (namespace, key, data, int(negative), now + ttl, now, len(data)))
+
+        self.writes += 1
+        if self.writes % PRUNE_INTERVAL == 0:
+            self.prune()
+
+    def prune(self):
+        """
+        Remove expired entries, then least recently used ones until the cache fits in max_size.
+        Returns the number of removed entries.
+        """
+        removed = self.db.execute('DELETE FROM entries WHERE expires <= ?', (time.time(),)).rowcount
+        total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total > self.max_size:
+            excess = total - self.max_size
+            rows = self.db.execute('SELECT namespace, key, size FROM entries ORDER BY accessed').fetchall()
+            evict = []
+            for namespace, key, size in rows:
+                if excess <= 0:
+                    break
+                evict.append((namespace, key))
+                excess -= size
+            self.db.executemany('DELETE FROM entries WHERE namespace = ? AND key = ?', evict)
+            removed += len(evict)
+        return removed
+
+    def clear(self, namespace=None):
+        if namespace:
+            self.db.execute('DELETE FROM entries WHERE namespace = ?', (namespace,))
+        else:
+            self.db.execute('DELETE FROM entries')
+        self.db.execute('VACUUM')
+
+    def stats(self):
+        """
+        Return per namespace counts of entries, negative entries, expired entries and their total size
+        """
+        rows = self.db.execute("""
+            SELECT namespace, COUNT(*), SUM(negative), SUM(expires <= ?), SUM(size)
+            FROM entries GROUP BY namespace ORDER BY namespace""", (time.time(),)).fetchall()
+        return { namespace: {'entries': n, 'negative': neg, 'expired': exp, 'size': size}
+                 for namespace, n, neg, exp, size in rows }
+
+cache = MetadataCache()
+
+def cached(namespace, normalize=lambda key: key.strip(), is_negative=lambda value: not value):
+    """
+    Decorator caching a single-argument fetch function in the metadata cache.
+    Results for which is_negative() is true are kept for the shorter negative TTL.
+
+    The decorated function gets `put(key, value)` to fill the cache from elsewhere,
+    e.g. from a batched fetch, and `in_cache(key)`.
+    """
+    span_name = f"cache.{namespace}"
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(key):
+            with profile.span(span_name) as span:
+                found, value = cache.get(namespace, normalize(key))
+                span.set(hit=found)
+            if not found:
+                value = func(key)
+                cache.put(namespace, normalize(key), value, is_negative(value))
+            return value
+
+        wrapper.put = lambda key, value: cache.put(namespace, normalize(key), value, is_negative(value))
+        wrapper.in_cache = lambda key: cache.contains(namespace, normalize(key))
+        return wrapper
+
+    return decorator
@@ -0,0 +1,117 @@
+import sqlite3
+import hashlib
+import json
+import os
+import re
+import time
+from pathlib import Path
+from prem.cache import CACHE_DIR
+
+CATALOG_FILE = f"{CACHE_DIR}/catalog.sqlite"
+
+# Maps the scheme used in dc:identifier to the source it was resolved from
+IDENTIFIER_SOURCES = {
+        'doi': 'crossref',
+        'arXiv': 'arxiv',
+        }
+
+def file_hash(filename, chunk_size=1<<20):
+    """
+    Compute the sha256 hex digest of a file's contents
+    """
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as fp:
+        while chunk := fp.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class Catalog:
+    """
+    On-disk record of processed pdfs, keyed by content hash.
+
+    Lookups first try the path with matching size/mtime so unchanged files
+    aren't even read. Moved or renamed files are found by their content hash.
+    """
+
+    def __init__(self, filename=CATALOG_FILE):
+        self.filename = filename
+        Path(filename).parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(filename, timeout=60)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                hash TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime INTEGER,
+                path TEXT,
+                identifier TEXT,
+                source TEXT,
+                metadata TEXT,
+                updated REAL
+            )""")
+        self.db.execute('CREATE INDEX IF NOT EXISTS files_path ON files (path)')
+        self.db.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    def lookup(self, filename):
+        """
+        Return the catalog entry for an unchanged file as a dict, or None.
+        """
+        stat = os.stat(filename)
+        path = os.path.abspath(filename)
+
+        row = self.db.execute('SELECT * FROM files WHERE path = ? AND size = ? AND mtime = ?',
+                              (path, stat.st_size, stat.st_mtime_ns)).fetchone()
+        if not row:
+            row = self.db.execute('SELECT * FROM files WHERE hash = ? AND size = ?',
+                                  (file_hash(filename), stat.st_size)).fetchone()
+            if row:
+                with self.db:
+                    self.db.execute('UPDATE files SET path = ?, mtime = ? WHERE hash = ?',
+                                    (path, stat.st_mtime_ns, row['hash']))
+
+        if not row:
+            return None
+
+        entry = dict(row)
+        entry['path'] = path
+        entry['metadata'] = json.loads(entry['metadata']) if entry['metadata'] else {}
+        return entry
+
+    def record(self, filename, metadata=None):
+        """
+        Store the final state of a processed file along with the metadata written into it.
+        """
+        metadata = metadata or {}
+        stat = os.stat(filename)
+
+        identifier = metadata.get('dc:identifier') or None
+        source = None
+        if identifier:
+            scheme, _, identifier = identifier.partition(':')
+            source = IDENTIFIER_SOURCES.get(scheme, scheme)
+            if source == 'arxiv':
+                # Stored without the version, like the identifiers found in pdfs
+                identifier = re.sub(r'v\d+$', '', identifier)
+
+        with self.db:
+            self.db.execute('DELETE FROM files WHERE path = ?', (os.path.abspath(filename),))
+            self.db.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                            (file_hash(filename), stat.st_size, stat.st_mtime_ns, os.path.abspath(filename),
+                             identifier, source, json.dumps(metadata, default=list), time.time()))
+
+    def paths(self, identifier):
+        """
+        Paths of the catalogued files resolved to an identifier, ignoring case
+        """
+        rows = self.db.execute('SELECT path FROM files WHERE identifier = ? COLLATE NOCASE', (identifier,))
+        return [ row['path'] for row in rows ]
@@ -0,0 +1,84 @@
+import logging
+from logging import LogRecord
+
+from rich.theme import Theme
+from rich.logging import RichHandler
+from rich.console import Console
+from rich.traceback import Traceback
+from rich._null_file import NullFile
+
+custom_logging_theme = Theme({
+    "debug": 'green',
+    "info" : 'none',
+    "note": "magenta",
+    "warn": "bold yellow",
+    "warning": "bold yellow",
+    "error": "bold red",
+    "critical": "bold red reverse"
+})
+
+shell_console = Console(theme = custom_logging_theme)
+
+
+class CustomHandler(RichHandler):
+
+    def emit(self, record: LogRecord) -> None:
+        """Invoked by logging."""
+        message = self.format(record)
+        traceback = None
+        if (
+            self.rich_tracebacks
+            and record.exc_info
+            and record.exc_info != (None, None, None)
+        ):
+            exc_type, exc_value, exc_traceback = record.exc_info
+            assert exc_type is not None
+            assert exc_value is not None
+            traceback = Traceback.from_exception(
+                exc_type,
+                exc_value,
+                exc_traceback,
+                width=self.tracebacks_width,
+                extra_lines=self.tracebacks_extra_lines,
+                theme=self.tracebacks_theme,
+                word_wrap=self.tracebacks_word_wrap,
+                show_locals=self.tracebacks_show_locals,
+                locals_max_length=self.locals_max_length,
+                locals_max_string=self.locals_max_string,
+                suppress=self.tracebacks_suppress,
+            )
+            message = record.getMessage()
+            if self.formatter:
+                record.message = record.getMessage()
+                formatter = self.formatter
+                if hasattr(formatter, "usesTime") and formatter.usesTime():
+                    record.asctime = formatter.formatTime(record, formatter.datefmt)
+                message = formatter.formatMessage(record)
+
+        message_renderable = self.render_message(record, message)
+        log_renderable = self.render(
+            record=record, traceback=traceback, message_renderable=message_renderable
+        )
+        if isinstance(self.console.file, NullFile):
+            # Handles pythonw, where stdout/stderr are null, and we return NullFile
+            # instance from Console.file. In this case, we still want to make a log record
+            # even though we won't be writing anything to a file.
+            self.handleError(record)
+        else:
+            try:
+                self.console.print(log_renderable, style=record.__dict__['style'])
+            except Exception:
+                self.handleError(record)
+
+# the handler determines where the logs go: stdout/file
+shell_handler = CustomHandler(
+        markup=True,
+        console=shell_console,
+        show_time=False,
+        show_level=False,
+        show_path=False,
+        )
+shell_handler.setLevel(logging.INFO)
+fmt_shell = '%(message)s'
+shell_formatter = logging.Formatter(fmt_shell)
+shell_handler.setFormatter(shell_formatter)
@@ -0,0 +1,101 @@
+import fnmatch
+import os
+import sys
+from prem.logging import defaultLogger
+
+PDF_MAGIC = b'%PDF-'
+
+# Readers accept junk before the header, within the first kilobyte
+MAGIC_WINDOW = 1024
+
+# Files searched for in directories, unless other patterns are given
+DEFAULT_INCLUDE = ['*.pdf']
+
+def is_pdf(path):
+    """
+    Whether a file starts with the pdf header, reading only its first kilobyte
+    """
+    try:
+        with open(path, 'rb') as fp:
+            return PDF_MAGIC in fp.read(MAGIC_WINDOW)
+    except OSError:
+        return False
+
+def matches(path, patterns):
+    """
+    Whether the name or the path of a file matches any of the glob patterns, ignoring case
+    """
+    path = path.lower()
+    name = os.path.basename(path)
+    return any(fnmatch.fnmatchcase(name, p.lower()) or fnmatch.fnmatchcase(path, p.lower()) for p in patterns)
+
+def walk(directory, exclude=()):
+    """
+    Yield the files under directory as they are listed, in name order per directory.
+    Symlinks to directories aren't followed, and excluded directories aren't entered.
+    """
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError as e:
+            defaultLogger.warning(f"Can't list {current}: {e}")
+            continue
+        subdirectories = []
+        for entry in entries:
+            if matches(entry.path, exclude):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.append(entry.path)
+                elif entry.is_file():
+                    yield entry.path
+            except OSError:
+                continue
+        stack.extend(reversed(subdirectories))
+
+def read_paths(fp):
+    """
+    Paths read one per line, as they come
+    """
+    for line in fp:
+        if line := line.rstrip('\r\n'):
+            yield line
+
+def expand(path, include, exclude):
+    if os.path.isdir(path):
+        return filter(lambda p: matches(p, include), walk(path, exclude))
+    return [path]
+
+def read_inputs(inputs, files_from, stdin):
+    """
+    Paths given as inputs, with `-` read from stdin, followed by the paths listed in files_from
+    """
+    for item in inputs:
+        yield from read_paths(stdin or sys.stdin) if item == '-' else [item]
+    for filename in files_from:
+        with open(filename) as fp:
+            yield from read_paths(fp)
+
+def find_pdfs(inputs, include=None, exclude=None, stdin=None, logger=None, files_from=None):
+    """
+    Lazily yield the pdfs among inputs: files, directories searched recursively for files
+    matching include, and `-` for paths read from stdin, then the paths listed one per line
+    in the files_from files. Paths matching exclude and files without a pdf header are skipped.
+    """
+    logger = logger or defaultLogger
+    include = include or DEFAULT_INCLUDE
+    exclude = exclude or []
+
+    for path in read_inputs(inputs, files_from or [], stdin):
+        for fname in expand(path, include, exclude):
+            if matches(fname, exclude):
+                continue
+            if not os.path.exists(fname):
+                logger.warning(f"No such file: {fname}")
+            elif not is_pdf(fname):
+                logger.warning(f"Not a pdf, skipping: {fname}")
+            else:
+                yield fname
@@ -0,0 +1,152 @@
+import hashlib
+import os
+import tempfile
+from collections import defaultdict
+from prem.catalog import file_hash
+from prem.logging import defaultLogger
+from prem.sqlite import SQLiteStore
+
+# Bytes hashed from each end of a file before comparing whole files
+PARTIAL_HASH_SIZE = 1 << 16
+
+def partial_hash(filename, size=PARTIAL_HASH_SIZE):
+    """
+    sha256 of the file size and of its first and last `size` bytes
+    """
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as fp:
+        length = os.fstat(fp.fileno()).st_size
+        digest.update(str(length).encode())
+        digest.update(fp.read(size))
+        if length > size:
+            fp.seek(max(size, length - size))
+            digest.update(fp.read(size))
+    return digest.hexdigest()
+
+class DuplicateFile(Exception):
+    """
+    Raised for a file resolving to the same identifier as another file
+    """
+
+    def __init__(self, original, identifier):
+        super().__init__(f"Duplicate of {original} ({identifier})")
+        self.original = original
+        self.identifier = identifier
+
+class ContentIndex:
+    """
+    Finds files with the same contents as an earlier one. Files with the same partial hash
+    are compared by full hash, as long as the earlier file wasn't changed in the meantime,
+    e.g. by processing it.
+    """
+
+    def __init__(self):
+        # partial hash -> [(path, (size, mtime) when seen)]
+        self.seen = defaultdict(list)
+        self.full_hashes = {}
+
+    def full_hash(self, filename):
+        if filename not in self.full_hashes:
+            self.full_hashes[filename] = file_hash(filename)
+        return self.full_hashes[filename]
+
+    def original(self, filename):
+        """
+        Return the earlier file with the same contents, or None and remember this one
+        """
+        stat = os.stat(filename)
+        same_partial = self.seen[partial_hash(filename)]
+        for other, signature in same_partial:
+            try:
+                other_stat = os.stat(other)
+            except FileNotFoundError:
+                continue
+            if (other_stat.st_size, other_stat.st_mtime_ns) == signature and self.full_hash(other) == self.full_hash(filename):
+                return other
+        same_partial.append((filename, (stat.st_size, stat.st_mtime_ns)))
+        return None
+
+class DuplicateIndex(SQLiteStore):
+    """
+    Identifiers claimed by the files of a run, and the duplicates found, in an SQLite
+    database shared by worker processes. The first file to claim an identifier is the original.
+    """
+
+    def __init__(self, filename=None):
+        if filename is None:
+            fd, filename = tempfile.mkstemp(prefix='prem-duplicates-', suffix='.sqlite')
+            os.close(fd)
+        super().__init__(filename)
+
+    def setup(self, db):
+        db.execute('CREATE TABLE IF NOT EXISTS claims (identifier TEXT PRIMARY KEY, path TEXT)')
+        db.execute('CREATE TABLE IF NOT EXISTS duplicates (path TEXT PRIMARY KEY, original TEXT, reason TEXT)')
+
+    def claim(self, identifier, filename):
+        """
+        Claim an identifier such as "doi:10.1038/nrn1907" for a file.
+        Returns the file that claimed it first if it isn't this one.
+        """
+        identifier = identifier.strip().lower()
+        path = os.path.abspath(filename)
+        self.db.execute('INSERT OR IGNORE INTO claims VALUES (?, ?)', (identifier, path))
+        original = self.db.execute('SELECT path FROM claims WHERE identifier = ?', (identifier,)).fetchone()[0]
+        if original != path:
+            self.add(filename, original, identifier)
+            return original
+
+    def add(self, filename, original, reason):
+        self.db.execute('INSERT OR REPLACE INTO duplicates VALUES (?, ?, ?)', (os.path.abspath(filename), os.path.abspath(original), reason))
+
+    def moved(self, filename, newname):
+        """
+        Point claims and duplicates at the new name of a renamed file
+        """
+        old, new = os.path.abspath(filename), os.path.abspath(newname)
+        self.db.execute('UPDATE claims SET path = ? WHERE path = ?', (new, old))
+        self.db.execute('UPDATE duplicates SET original = ? WHERE original = ?', (new, old))
+
+    def duplicates(self):
+        """
+        (duplicate, original, reason) for every duplicate found, by original
+        """
+        return self.db.execute('SELECT path, original, reason FROM duplicates ORDER BY original, path').fetchall()
+
+    def remove(self):
+        for suffix in ['', '-wal', '-shm']:
+            if os.path.exists(self.filename + suffix):
+                os.remove(self.filename + suffix)
+
+def link(filename, original):
+    """
+    Replace filename with a hard link to original
+    """
+    temporary = f"{filename}.prem-link"
+    os.link(original, temporary)
+    os.replace(temporary, filename)
+
+def skip_copies(filenames, index, mode='skip', logger=None):
+    """
+    Yield the files that aren't byte for byte copies of an earlier one, and record
+    the copies in the index. In link mode, copies are replaced by hard links to the original.
+    """
+    logger = logger or defaultLogger
+    contents = ContentIndex()
+    for filename in filenames:
+        try:
+            original = contents.original(filename)
+        except OSError:
+            original = None
+        if not original:
+            yield filename
+            continue
+
+        index.add(filename, original, 'same content')
+        if mode == 'link' and not os.path.samefile(filename, original):
+            try:
+                link(filename, original)
+                logger.info(f"Linked copy of [bold magenta]{original}[/bold magenta]: {filename}")
+                continue
+            except OSError as e:
+                logger.warning(f"Couldn't link {filename} to {original}: {e}")
+        logger.info(f"Skipping copy of [bold magenta]{original}[/bold magenta]: {filename}")
@@ -0,0 +1,144 @@
+import io
+from collections import defaultdict
+
+# Each engine imports its library when it is first used
+
+class PdfplumberEngine:
+    """
+    Full character-level layout analysis. Slowest, but gives the most readable text.
+    """
+    name = 'pdfplumber'
+
+    def __init__(self, pdf):
+        import pdfplumber
+        self.document = pdfplumber.open(pdf.filename)
+
+    def page_text(self, index):
+        page = self.document.pages[index]
+        text = page.extract_text() or ''
+        # Drop the cached character objects of the page
+        page.flush_cache()
+        return text
+
+    def largest_text(self, index, min_chars=5, max_chars=300):
+        """
+        The words of a page set in the largest font used for between min_chars and max_chars
+        characters, in reading order. On a first page, that's usually the title: the bounds
+        skip drop caps, logos and pages set in a single size.
+        """
+        page = self.document.pages[index]
+        words = page.extract_words(extra_attrs=['size'])
+        page.flush_cache()
+        chars = defaultdict(int)
+        for word in words:
+            chars[round(word['size'], 1)] += len(word['text'])
+        size = max(filter(lambda s: min_chars <= chars[s] <= max_chars, chars), default=None)
+        return ' '.join(word['text'] for word in words if round(word['size'], 1) == size)
+
+    def close(self):
+        self.document.close()
+
+class PdfminerEngine:
+    """
+    pdfminer with only line grouping: no text box ordering, which is the costly part of
+    layout analysis. Vertical text such as the arXiv margin stamp reads forwards.
+    """
+    name = 'pdfminer'
+
+    def __init__(self, pdf):
+        from pdfminer.pdfparser import PDFParser
+        from pdfminer.pdfdocument import PDFDocument
+        from pdfminer.pdfinterp import PDFResourceManager
+        from pdfminer.layout import LAParams
+        self.fp = open(pdf.filename, 'rb')
+        self.document = PDFDocument(PDFParser(self.fp))
+        self.page_iterator = None
+        self.next_index = 0
+        # Fonts are still cached by the resource manager, across pages
+        self.resource_manager = PDFResourceManager(caching=True)
+        self.laparams = LAParams(boxes_flow=None, detect_vertical=True)
+
+    def page(self, index):
+        """
+        Create the page at index, going through the page tree from the last page created.
+        Pages passed on the way aren't kept, so memory doesn't grow with the length of the document.
+        """
+        from pdfminer.pdfpage import PDFPage
+        if self.page_iterator is None or index < self.next_index:
+            self.page_iterator = PDFPage.create_pages(self.document)
+            self.next_index = 0
+        for page in self.page_iterator:
+            self.next_index += 1
+            self.release()
+            if self.next_index - 1 == index:
+                return page
+        raise IndexError(f"No page {index}")
+
+    def release(self):
+        """
+        Drop the objects read so far, such as the content streams of earlier pages.
+        Fonts are kept by the resource manager, and parsed object streams by the document:
+        streams can't be stored in them, so they stay small.
+        """
+        getattr(self.document, '_cached_objs', {}).clear()
+
+    def page_text(self, index):
+        from pdfminer.pdfinterp import PDFPageInterpreter
+        from pdfminer.converter import TextConverter
+        out = io.StringIO()
+        device = TextConverter(self.resource_manager, out, laparams=self.laparams)
+        PDFPageInterpreter(self.resource_manager, device).process_page(self.page(index))
+        device.close()
+        return out.getvalue()
+
+    def close(self):
+        self.page_iterator = None
+        self.fp.close()
+
+class PikepdfEngine:
+    """
+    Decode the strings of text operators straight from the content stream of the
+    already open pikepdf document. Fastest, but only reads fonts with simple
+    encodings and skips text inside form XObjects.
+    """
+    name = 'pikepdf'
+    operators = "Tj TJ ' \" Td TD T* Tm ET"
+
+    # TJ offsets (in thousandths of text space) larger than this are read as a space
+    space_offset = 200
+
+    def __init__(self, pdf):
+        self.pdf = pdf.pdf
+
+    def page_text(self, index):
+        import pikepdf
+        out = []
+        for operands, operator in pikepdf.parse_content_stream(self.pdf.pages[index], self.operators):
+            op = str(operator)
+            if op == 'Tj':
+                out.append(bytes(operands[0]).decode('latin-1'))
+            elif op in ["'", '"']:
+                out.append('\n' + bytes(operands[-1]).decode('latin-1'))
+            elif op == 'TJ':
+                for item in operands[0]:
+                    if isinstance(item, pikepdf.String):
+                        out.append(bytes(item).decode('latin-1'))
+                    elif -float(item) > self.space_offset:
+                        out.append(' ')
+            elif op in ['Td', 'TD']:
+                out.append(' ' if float(operands[1]) == 0 else '\n')
+            else:
+                out.append('\n')
+        return ''.join(out)
+
+    def close(self):
+        pass
+
+ENGINES = {
+        'pdfminer': PdfminerEngine,
+        'pikepdf': PikepdfEngine,
+        'pdfplumber': PdfplumberEngine,
+        }
+
+# Used for identifier searches. pdfplumber is kept for text meant to be read.
+DEFAULT_ENGINE = 'pdfminer'
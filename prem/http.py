@@ -0,0 +1,96 @@
+from prem import profile
+from email.utils import parsedate_to_datetime
+from functools import partial
+from urllib.parse import urlparse
+import os
+import random
+import threading
+import time
+
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 30
+RETRIES = 4
+BACKOFF = 1
+MAX_BACKOFF = 60
+RETRY_STATUS = {429, 500, 502, 503, 504}
+POOL_SIZE = 16
+
+# CrossRef routes requests with a contact address to its "polite" pool
+MAILTO = os.environ.get('PREM_MAILTO')
+USER_AGENT = "prem (https://github.com/jayghoshter/prem" + (f"; mailto:{MAILTO})" if MAILTO else ")")
+
+sessions = {}
+sessions_lock = threading.Lock()
+
+def session(url):
+    """
+    Return the session for the host of `url`, creating it on first use.
+    Sessions are kept per process so that forked workers don't share sockets.
+    """
+    parsed = urlparse(url)
+    key = (os.getpid(), parsed.scheme, parsed.netloc)
+
+    with sessions_lock:
+        if key not in sessions:
+            # requests is imported with the first session, not with prem
+            import requests
+            from requests.adapters import HTTPAdapter
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+            s.mount(f"{parsed.scheme}://", adapter)
+            s.headers['User-Agent'] = USER_AGENT
+            sessions[key] = s
+        return sessions[key]
+
+def retry_after(response):
+    """
+    Seconds to wait as asked by a Retry-After header, or None
+    """
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0, float(value))
+    except ValueError:
+        try:
+            return max(0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+def backoff(attempt):
+    """
+    Exponential backoff with full jitter
+    """
+    return random.uniform(0, min(MAX_BACKOFF, BACKOFF * 2 ** attempt))
+
+def get(url, params=None, headers=None, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), retries=RETRIES):
+    """
+    GET a url through the pooled session for its host.
+    Connection errors, timeouts and 429/5xx responses are retried up to `retries` times.
+    The last response is returned as is, the last connection error is raised.
+    """
+    import requests
+    for attempt in range(retries + 1):
+        try:
+            with profile.span(f"http.{urlparse(url).netloc}", attempt=attempt) as span:
+                response = session(url).get(url, params=params, headers=headers, timeout=timeout)
+                span.set(status=response.status_code)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == retries:
+                raise
+            delay = backoff(attempt)
+        else:
+            if response.status_code not in RETRY_STATUS or attempt == retries:
+                return response
+            delay = retry_after(response)
+            delay = min(delay, MAX_BACKOFF) if delay is not None else backoff(attempt)
+        time.sleep(delay)
+
+async def aget(url, **kwargs):
+    """
+    Asyncio variant of get(), run in the default executor so that the
+    connection pools are shared with synchronous callers.
+    """
+    import asyncio
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, partial(get, url, **kwargs))
@@ -1,93 +1,14 @@
 import logging
 import inspect
-
-from rich.theme import Theme
-from rich.logging import RichHandler
-from rich.console import Console
-
-from logging import LogRecord, Logger
-from rich.traceback import Traceback
-from rich._null_file import NullFile
-
-custom_logging_theme = Theme({
-    "debug": 'green',
-    "info" : 'none',
-    "note": "magenta",
-    "warn": "bold yellow",
-    "warning": "bold yellow",
-    "error": "bold red",
-    "critical": "bold red reverse"
-})
-
-shell_console = Console(theme = custom_logging_theme)
-
-
-class CustomHandler(RichHandler):
-
-    def emit(self, record: LogRecord) -> None:
-        """Invoked by logging."""
-        message = self.format(record)
-        traceback = None
-        if (
-            self.rich_tracebacks
-            and record.exc_info
-            and record.exc_info != (None, None, None)
-        ):
-            exc_type, exc_value, exc_traceback = record.exc_info
-            assert exc_type is not None
-            assert exc_value is not None
-            traceback = Traceback.from_exception(
-                exc_type,
-                exc_value,
-                exc_traceback,
-                width=self.tracebacks_width,
-                extra_lines=self.tracebacks_extra_lines,
-                theme=self.tracebacks_theme,
-                word_wrap=self.tracebacks_word_wrap,
-                show_locals=self.tracebacks_show_locals,
-                locals_max_length=self.locals_max_length,
-                locals_max_string=self.locals_max_string,
-                suppress=self.tracebacks_suppress,
-            )
-            message = record.getMessage()
-            if self.formatter:
-                record.message = record.getMessage()
-                formatter = self.formatter
-                if hasattr(formatter, "usesTime") and formatter.usesTime():
-                    record.asctime = formatter.formatTime(record, formatter.datefmt)
-                message = formatter.formatMessage(record)
-
-        message_renderable = self.render_message(record, message)
-        log_renderable = self.render(
-            record=record, traceback=traceback, message_renderable=message_renderable
-        )
-        if isinstance(self.console.file, NullFile):
-            # Handles pythonw, where stdout/stderr are null, and we return NullFile
-            # instance from Console.file. In this case, we still want to make a log record
-            # even though we won't be writing anything to a file.
-            self.handleError(record)
-        else:
-            try:
-                self.console.print(log_renderable, style=record.__dict__['style'])
-            except Exception:
-                self.handleError(record)
-
-# the handler determines where the logs go: stdout/file
-shell_handler = CustomHandler(
-        markup=True,
-        console=shell_console,
-        show_time=False,
-        show_level=False,
-        show_path=False,
-        )
-shell_handler.setLevel(logging.INFO)
-fmt_shell = '%(message)s'
-shell_formatter = logging.Formatter(fmt_shell)
-shell_handler.setFormatter(shell_formatter)
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from logging.handlers import QueueHandler, QueueListener
+from logging import Logger
 
 # the handler determines where the logs go: stdout/file
 log_filename = "prem.log"
-file_handler = logging.FileHandler(log_filename)
+# prem.log is only created once something is logged
+file_handler = logging.FileHandler(log_filename, delay=True)
 file_handler.setLevel(logging.INFO)
 fmt_file = '%(levelname)s [%(asctime)s] %(message)s'
 file_formatter = logging.Formatter(fmt_file)
@@ -99,8 +20,13 @@ class CustomLogger(Logger):
         Initialize the logger with a name and an optional level.
         """
         super().__init__(name, level)
-        self.addHandler(shell_handler)
-        self.addHandler(file_handler)
+
+    def callHandlers(self, record):
+        # The console handler imports rich, so handlers are only added once something is logged
+        if not self.handlers:
+            self.addHandler(get_shell_handler())
+            self.addHandler(file_handler)
+        super().callHandlers(record)
 
     # Override _log() to modify message with indent_str
     def _log(self, level, msg, args, exc_info=None, extra=None, stack_info=False,
@@ -144,11 +70,61 @@ class BufferedLogger(CustomLogger):
         extra['style'] = logging._levelToName[level].lower()
         self.log_data.append((level, msg, args, exc_info, extra, stack_info, stacklevel))
 
-    def flush(self, lock):
-        lock.acquire()
-        for level, msg, args, exc_info, extra, stack_info, stacklevel in self.log_data:
-            super()._log(level, msg, args, exc_info=exc_info, extra=extra, stack_info=stack_info, stacklevel=stacklevel)
-        lock.release()
+    def flush(self, lock=None):
+        with lock or nullcontext():
+            for level, msg, args, exc_info, extra, stack_info, stacklevel in self.log_data:
+                super()._log(level, msg, args, exc_info=exc_info, extra=extra, stack_info=stack_info, stacklevel=stacklevel)
+        self.log_data = []
+
+class QueueLogger(CustomLogger):
+    def __init__(self, name, group, queue, level=logging.NOTSET):
+        """
+        Send records to the listener of the main process as soon as they are logged.
+        Records are tagged with a group (e.g. the file being processed), and the listener
+        prints each group in one piece once flush() ends it.
+        """
+        Logger.__init__(self, name, level)
+        self.addHandler(QueueHandler(queue))
+        self.group = group
+
+    def _log(self, level, msg, args, exc_info=None, extra=None, stack_info=False,
+             stacklevel=1, **kwargs):
+        extra = dict(extra or {}, group=self.group)
+        super()._log(level, msg, args, exc_info=exc_info, extra=extra, stack_info=stack_info, stacklevel=stacklevel, **kwargs)
+
+    def flush(self, lock=None):
+        self.handle(self.makeRecord(self.name, logging.INFO, '', 0, '', (), None, extra={'group': self.group, 'end_group': True}))
+
+class GroupingHandler(logging.Handler):
+    def __init__(self, *handlers):
+        """
+        Hold the records of each group until it ends and then pass them on to handlers
+        together, so that the output of concurrent groups doesn't interleave.
+        Records without a group are passed on right away.
+        """
+        super().__init__()
+        self.handlers = handlers
+        self.groups = defaultdict(list)
+
+    def emit(self, record):
+        group = getattr(record, 'group', None)
+        if group is None:
+            self.forward(record)
+        elif getattr(record, 'end_group', False):
+            list(map(self.forward, self.groups.pop(group, [])))
+        else:
+            self.groups[group].append(record)
+
+    def forward(self, record):
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def close(self):
+        # Groups that never ended, e.g. of a crashed worker
+        for group in list(self.groups):
+            list(map(self.forward, self.groups.pop(group)))
+        super().close()
 
 # logging.setLoggerClass(CustomLogger)
 
@@ -157,8 +133,55 @@ defaultLogger = CustomLogger('default')
 logger_methods = dict(inspect.getmembers(defaultLogger, predicate=inspect.ismethod))
 defaultLogger.setLevel(logging.INFO)
 
-defaultLogger.addHandler(shell_handler)
-defaultLogger.addHandler(file_handler)
+def get_shell_handler():
+    from prem.console import shell_handler
+    return shell_handler
+
+def __getattr__(name):
+    """
+    The rich console and handler live in prem.console, imported on first access
+    """
+    if name in ['custom_logging_theme', 'shell_console', 'CustomHandler', 'shell_handler']:
+        from prem import console
+        return getattr(console, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Set in worker processes logging through the listener of the main process
+log_queue = None
+
+def init_worker(queue):
+    """
+    Pool initializer: send the records of this worker to the listener of the main
+    process, which owns the console and the log file.
+    """
+    global log_queue
+    log_queue = queue
+    defaultLogger.handlers = [QueueHandler(queue)]
+
+@contextmanager
+def queue_logging(context=None):
+    """
+    Run a listener printing the records sent by workers set up with init_worker.
+    Yields the queue to pass to init_worker, from the multiprocessing context of their pool.
+    """
+    import multiprocessing
+    queue = (context or multiprocessing).Queue()
+    handler = GroupingHandler(get_shell_handler(), file_handler)
+    listener = QueueListener(queue, handler)
+    listener.start()
+    try:
+        yield queue
+    finally:
+        listener.stop()
+        handler.close()
+
+def file_logger(group):
+    """
+    Logger for the output about one file in a worker process
+    """
+    if log_queue is not None:
+        return QueueLogger('prem', group, log_queue)
+    return BufferedLogger('prem')
 
 log_default_indent_level = 0
 log_default_indent_step = 2
@@ -0,0 +1,69 @@
+import re
+from collections import namedtuple
+
+# `where` is the page index for hits in the text, the metadata key for hits in the metadata
+Hit = namedtuple('Hit', ['kind', 'value', 'where', 'start', 'end'])
+
+class Matcher:
+    """
+    Find identifiers of every registered kind in a single pass over a string.
+
+    Sources register their patterns under an identifier kind ('doi', 'arxiv', ...).
+    All patterns are combined into one alternation of named groups, so the text is
+    scanned once however many sources there are. Sources sharing a kind share its hits.
+
+    An optional transform is applied to the matched string, e.g. to read back a
+    pattern written for reversed text.
+    """
+
+    def __init__(self):
+        self.patterns = []
+        self._compiled = {}
+
+    def register(self, kind, pattern, transform=None):
+        if isinstance(pattern, re.Pattern):
+            pattern = pattern.pattern
+        if (kind, pattern, transform) not in self.patterns:
+            self.patterns.append((kind, pattern, transform))
+            self._compiled = {}
+
+    @property
+    def kinds(self):
+        return list(dict.fromkeys(map(lambda p: p[0], self.patterns)))
+
+    def compiled(self, type=str):
+        """
+        The combined pattern, for str or for bytes (raw metadata)
+        """
+        if type not in self._compiled:
+            pattern = '|'.join(map(lambda ip: f"(?P<p{ip[0]}>{ip[1][1]})", enumerate(self.patterns)))
+            self._compiled[type] = re.compile(pattern if type is str else pattern.encode())
+        return self._compiled[type]
+
+    def finditer(self, text, where=None, kinds=None):
+        """
+        Yield a Hit per match in text (str or bytes), in order of position.
+        With kinds, only hits of those kinds are returned. Values are always str.
+        """
+        if not self.patterns:
+            return
+        for match in self.compiled(type(text)).finditer(text):
+            kind, _, transform = self.patterns[int(match.lastgroup[1:])]
+            if kinds is not None and kind not in kinds:
+                continue
+            value = match.group()
+            if isinstance(value, bytes):
+                value = value.decode('utf-8', 'replace')
+            value = transform(value) if transform else value
+            yield Hit(kind, value, where, match.start(), match.end())
+
+    def find(self, text, where=None, kinds=None):
+        return list(self.finditer(text, where, kinds))
+
+def group_values(hits, kinds):
+    """
+    Unique hit values per kind, in order of appearance
+    """
+    return list(map(lambda kind: list(dict.fromkeys(h.value for h in hits if h.kind == kind)), kinds))
+
+matcher = Matcher()
@@ -0,0 +1,40 @@
+import ctypes
+import ctypes.util
+import gc
+import os
+import resource
+
+MiB = 1 << 20
+
+def rss():
+    """
+    Resident set size of this process in bytes, or its peak where /proc isn't available
+    """
+    try:
+        with open('/proc/self/statm') as fp:
+            return int(fp.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def limit(megabytes=None):
+    """
+    Make allocations beyond `megabytes` of data in this process fail with MemoryError,
+    so that a huge file fails on its own instead of the kernel killing the process when
+    memory runs out. Does nothing without a limit.
+    """
+    if not megabytes:
+        return
+    kind = getattr(resource, 'RLIMIT_DATA', resource.RLIMIT_AS)
+    _, hard = resource.getrlimit(kind)
+    soft = megabytes * MiB if hard == resource.RLIM_INFINITY else min(megabytes * MiB, hard)
+    resource.setrlimit(kind, (soft, hard))
+
+def release():
+    """
+    Collect garbage and give the freed heap memory back to the system
+    """
+    gc.collect()
+    try:
+        ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6').malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
@@ -0,0 +1,143 @@
+import json
+import math
+import threading
+import time
+from collections import defaultdict
+from functools import wraps
+
+# Spans are only timed when enabled. Forked workers inherit the flag.
+enabled = False
+
+# Spans covering all the work on a file, summed as its total in the trace
+FILE_SPANS = ('driver', 'scan', 'resolve', 'write')
+
+_local = threading.local()
+
+def enable(flag=True):
+    global enabled
+    enabled = flag
+
+class Span:
+    """
+    Times a `with` block and records it in the spans collected by the current thread
+    """
+    __slots__ = ('name', 'attrs', 'start')
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        spans = getattr(_local, 'spans', None)
+        if spans is not None:
+            spans.append((self.name, time.perf_counter() - self.start, self.attrs))
+
+class NullSpan:
+    """
+    What span() returns when profiling is disabled: does nothing
+    """
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+NULL_SPAN = NullSpan()
+
+def span(name, **attrs):
+    return Span(name, attrs) if enabled else NULL_SPAN
+
+def profiled(name):
+    """
+    Decorator timing every call of a function as a span
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            with Span(name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def start():
+    """
+    Start collecting the spans recorded by this thread, e.g. for one file
+    """
+    if enabled:
+        _local.spans = []
+
+def stop():
+    """
+    Stop collecting and return the spans recorded since start(), as (name, seconds, attrs)
+    """
+    spans = getattr(_local, 'spans', None) or []
+    _local.spans = None
+    return spans
+
+def percentile(values, p):
+    """
+    Nearest rank percentile of sorted values
+    """
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+class Report:
+    """
+    Aggregate the spans of all files of a run, and optionally write one JSON line per file.
+    """
+
+    def __init__(self):
+        self.durations = defaultdict(list)
+        self.hits = defaultdict(lambda: [0, 0])
+        self.trace_file = None
+        self.lock = threading.Lock()
+
+    def open_trace(self, filename):
+        self.trace_file = open(filename, 'a')
+
+    def add(self, filename, spans):
+        if not spans:
+            return
+        with self.lock:
+            for name, seconds, attrs in spans:
+                self.durations[name].append(seconds)
+                if 'hit' in attrs:
+                    self.hits[name][0] += bool(attrs['hit'])
+                    self.hits[name][1] += 1
+            if self.trace_file:
+                trace = {'file': str(filename), 'total': sum(s for n, s, a in spans if n in FILE_SPANS),
+                         'spans': [ {'name': n, 'ms': round(1000 * s, 3), **a} for n, s, a in spans ]}
+                self.trace_file.write(json.dumps(trace, default=str) + '\n')
+
+    def table(self):
+        """
+        Lines of the per-stage table, slowest total first. Nested spans overlap, so totals don't add up.
+        """
+        lines = [f"{'stage':<24} {'count':>6} {'total s':>9} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'hit %':>6}"]
+        for name, durations in sorted(self.durations.items(), key=lambda item: -sum(item[1])):
+            durations = sorted(durations)
+            hits, lookups = self.hits.get(name, (0, 0))
+            hit_ratio = f"{100 * hits / lookups:.0f}" if lookups else ''
+            lines.append(f"{name:<24} {len(durations):>6} {sum(durations):>9.3f} {1000 * percentile(durations, 50):>9.2f} "
+                         f"{1000 * percentile(durations, 95):>9.2f} {1000 * durations[-1]:>9.2f} {hit_ratio:>6}")
+        return lines
+
+    def close(self):
+        if self.trace_file:
+            self.trace_file.close()
+            self.trace_file = None
+
+report = Report()
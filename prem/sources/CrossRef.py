@@ -1,13 +1,18 @@
-import requests
 from collections import defaultdict
-from joblib import Memory
 import os
 from prem.utils import string_sanitizer
 from prem.logging import defaultLogger
+from prem import http
+from prem.cache import cached
+from prem.matcher import matcher
+from prem import profile
+from prem import titles
 import re
 
-CACHE_DIR = f"{os.environ['HOME']}/.cache/prem"
-memory = Memory(location=CACHE_DIR, verbose=0)
+API_URL = os.environ.get('PREM_CROSSREF_API', 'https://api.crossref.org')
+
+# Number of DOIs resolved per /works?filter= request
+BATCH_SIZE = 50
 
 doi_regex = r'10\.\d{4,9}/[A-Za-z0-9./:;()\-_]+'
 doi_regex_compiled = re.compile(doi_regex)
@@ -19,22 +24,81 @@ doi_journal_regex_compiled = re.compile(doi_journal_regex)
 identifier_name = 'DOI'
 identifier_regex = doi_journal_regex
 identifier_regex_compiled = doi_journal_regex_compiled
+identifier_kind = 'doi'
+
+matcher.register(identifier_kind, identifier_regex)
 
-@memory.cache
+@cached('crossref', normalize=lambda doi: doi.strip().lower())
 def fetch_metadata_crossref(doi:str):
     """
-    Fetch metadata for a given DOI from CrossRef
+    Fetch metadata for a given DOI from CrossRef.
+    Only an unknown DOI (404) gives {}, cached as missing. Other failures raise,
+    so that they aren't cached and the DOI is tried again next time.
     """
-    response = requests.get(f"https://api.crossref.org/works/{doi}")
+    response = http.get(f"{API_URL}/works/{doi}")
 
-    if not response.ok: 
+    if response.status_code == 404:
         return {}
+    if not response.ok: 
+        raise RuntimeError(f"Error fetching {doi}: {response.status_code}")
 
     return response.json()["message"]
 
+def fetch_metadata_crossref_batch(dois, batch_size=BATCH_SIZE):
+    """
+    Fetch metadata for many DOIs with as few requests as possible using the
+    multi-DOI filter on /works. Returns a dict of DOI to metadata for the
+    DOIs that were found.
+    """
+    # A comma would split the filter value, so these can't be batched
+    dois = [ doi for doi in dict.fromkeys(dois) if ',' not in doi ]
+    results = {}
+
+    for start in range(0, len(dois), batch_size):
+        batch = dois[start:start + batch_size]
+        params = {
+                'filter': ','.join(map(lambda doi: f"doi:{doi}", batch)),
+                'rows': len(batch),
+                }
+        response = http.get(f"{API_URL}/works", params=params)
+
+        if not response.ok: 
+            continue
+
+        # CrossRef may return DOIs in a different case than requested
+        requested = { doi.lower(): doi for doi in batch }
+        for item in response.json()["message"]["items"]:
+            doi = requested.get(item.get('DOI', '').lower())
+            if doi:
+                results[doi] = item
+
+    return results
+
+def prefetch(dois, logger=None):
+    """
+    Resolve all uncached DOIs in batches and fill the cache with the results so that
+    later calls to fetch_and_parse() for any of them don't need a request.
+    Returns a dict of DOI to parsed metadata for the DOIs that were resolved.
+    """
+    logger = logger or defaultLogger
+    module_name = __name__.split('.')[-1]
+
+    dois = list(filter(lambda doi: not fetch_metadata_crossref.in_cache(doi), set(dois)))
+    if not dois:
+        return {}
+
+    results = fetch_metadata_crossref_batch(dois)
+    logger.info(f"Prefetched metadata for {len(results)}/{len(dois)} DOIs from {module_name}")
+
+    for doi, mdata in results.items():
+        fetch_metadata_crossref.put(doi, mdata)
+
+    return { doi: parse(mdata, logger) for doi, mdata in results.items() }
+
 def fetch_by_doi(doi:str):
     return fetch_metadata_crossref(doi)
 
+@profile.profiled('source.crossref')
 def fetch_and_parse(doi:str, logger=None):
     """
     Fetch metadata from CrossRef based on provided id and parse it into a useful dict.
@@ -42,7 +106,11 @@ def fetch_and_parse(doi:str, logger=None):
     logger = logger or defaultLogger
     module_name = __name__.split('.')[-1]
 
-    mdata = fetch_by_doi(doi)
+    try:
+        mdata = fetch_by_doi(doi)
+    except RuntimeError as e:
+        logger.error(f"Error fetching metadata from {module_name}: {e}", indent_level=1)
+        return defaultdict(str)
     if not mdata:
         logger.error(f"Error fetching metadata from {module_name}", indent_level=1)
         return defaultdict(str)
@@ -50,18 +118,58 @@ def fetch_and_parse(doi:str, logger=None):
 
     return parse(mdata, logger)
 
+def query_string(text):
+    """
+    The query for the first line of text: ascii words joined with +, at most 120 characters
+    """
+    text = text.split('\n')[0].encode('ascii', 'ignore').decode()
+    return re.sub(r'[\-:\.\?,\s]+', '+', text).strip('+')[:120]
+
+@cached('crossref-query', normalize=lambda string: ' '.join(re.split(r'[+\s]+', string.strip().lower())))
 def query(string):
     """ Given a title string, return search results """
-    response = requests.get(f"https://api.crossref.org/works?query={string}")
+    response = http.get(f"{API_URL}/works?query={string}")
 
     if not response.ok: 
-        print(response)
-        raise RuntimeError(f"Error querying for string: {string}")
+        raise RuntimeError(f"Error querying for string: {string}: {response.status_code}")
 
     result = defaultdict(str, response.json()["message"])
 
     return result["items"]
 
+def score(title, text, mdata):
+    """
+    Confidence that a search result is the document with the guessed title and first page text
+    """
+    record_titles = list(mdata.get('title') or [])
+    record_titles += [ f"{t}: {s}" for t in record_titles for s in mdata.get('subtitle') or [] ]
+    authors = [ a.get('family', '') for a in mdata.get('author') or [] ]
+    year = ((mdata.get('issued') or {}).get('date-parts') or [[None]])[0][0]
+    return titles.score(title, text, record_titles, authors, year)
+
+@profile.profiled('source.crossref.title')
+def match_title(title, text, threshold=titles.THRESHOLD, logger=None):
+    """
+    Search for a guessed title and score the results against it and the first page text.
+    Returns the parsed metadata of the best result if its score reaches threshold
+    (or None), with the best score.
+    """
+    logger = logger or defaultLogger
+    querystr = query_string(title)
+    if not querystr:
+        return None, 0
+    results = list(map(lambda m: (score(title, text, m), m), query(querystr)))
+    best_score, best = max(results, key=lambda r: r[0], default=(0, None))
+    if not best:
+        return None, 0
+
+    best_title = (best.get('title') or [''])[0]
+    if best_score < threshold:
+        logger.warning(f"Best title match {best_score:.2f} is below {threshold}: {best_title}", indent_level=1)
+        return None, best_score
+    logger.info(f"Matched title with {best_score:.2f}: {best_title} ({best.get('DOI')})", indent_level=1)
+    return parse(best, logger), best_score
+
 def parse(mdata:dict, logger=None): 
     """
     Extract metadata from given crossref metadata dictionary.
@@ -0,0 +1,168 @@
+from pathlib import Path
+import gzip
+import json
+import os
+import zlib
+from prem.logging import defaultLogger
+from prem import profile
+from prem.cache import CACHE_DIR
+from prem.sqlite import SQLiteStore
+from prem.sources import CrossRef
+from prem.sources.CrossRef import parse, query, identifier_name, identifier_regex, identifier_regex_compiled, identifier_kind
+
+INDEX_FILE = os.environ.get('PREM_CROSSREF_DUMP') or f"{CACHE_DIR}/crossref-dump.sqlite"
+
+# Records written per transaction while building the index
+BUILD_BATCH_SIZE = 10000
+
+# Maximum number of DOIs per lookup query
+LOOKUP_BATCH_SIZE = 500
+
+def open_dump_file(path):
+    return gzip.open(path, 'rt', encoding='utf-8') if str(path).endswith('.gz') else open(path, encoding='utf-8')
+
+def iter_records(path):
+    """
+    Yield CrossRef works records from a dump file or a directory of them.
+
+    - .json(.gz): a file of the public data dump ({"items": [...]}), an API
+      response ({"message": {"items": [...]}} or {"message": record}), a list of
+      records or a single record.
+    - .jsonl(.gz): one record, or API response, per line.
+    """
+    path = Path(path)
+    if path.is_dir():
+        for child in sorted(path.iterdir()):
+            yield from iter_records(child)
+        return
+
+    name = path.name.lower()
+    if name.endswith(('.jsonl', '.jsonl.gz', '.ndjson', '.ndjson.gz')):
+        with open_dump_file(path) as fp:
+            for line in fp:
+                if line.strip():
+                    yield from unwrap(json.loads(line))
+    elif name.endswith(('.json', '.json.gz')):
+        with open_dump_file(path) as fp:
+            yield from unwrap(json.load(fp))
+
+def unwrap(data):
+    if isinstance(data, list):
+        for item in data:
+            yield from unwrap(item)
+    elif 'message' in data:
+        yield from unwrap(data['message'])
+    elif 'items' in data:
+        yield from unwrap(data['items'])
+    elif 'DOI' in data:
+        yield data
+
+class DumpIndex(SQLiteStore):
+    """
+    DOI -> CrossRef works record index in an SQLite database built from a CrossRef
+    bulk dump. Records are stored as compressed JSON, so the index can be used
+    without the dump files.
+    """
+
+    def __init__(self, filename=INDEX_FILE):
+        super().__init__(filename)
+
+    def setup(self, db):
+        db.execute('CREATE TABLE IF NOT EXISTS works (doi TEXT PRIMARY KEY, record BLOB) WITHOUT ROWID')
+
+    def exists(self):
+        return os.path.isfile(self.filename)
+
+    def get(self, doi):
+        if not self.exists():
+            return None
+        with profile.span('dump.lookup') as span:
+            row = self.db.execute('SELECT record FROM works WHERE doi = ?', (doi.strip().lower(),)).fetchone()
+            span.set(hit=bool(row))
+        return json.loads(zlib.decompress(row[0])) if row else None
+
+    def get_many(self, dois):
+        """
+        Return a dict of DOI to record for the given DOIs found in the index
+        """
+        if not self.exists():
+            return {}
+        requested = { doi.strip().lower(): doi for doi in dois }
+        keys = list(requested)
+        results = {}
+        for start in range(0, len(keys), LOOKUP_BATCH_SIZE):
+            batch = keys[start:start + LOOKUP_BATCH_SIZE]
+            rows = self.db.execute(f"SELECT doi, record FROM works WHERE doi IN ({','.join('?' * len(batch))})", batch)
+            for doi, record in rows:
+                results[requested[doi]] = json.loads(zlib.decompress(record))
+        return results
+
+    def add(self, records):
+        rows = [ (record['DOI'].lower(), zlib.compress(json.dumps(record).encode())) for record in records ]
+        with self.db:
+            self.db.execute('BEGIN')
+            self.db.executemany('INSERT OR REPLACE INTO works VALUES (?, ?)', rows)
+        return len(rows)
+
+    def build(self, paths, logger=None):
+        """
+        Add every record found in the given dump files or directories.
+        Returns the number of records added.
+        """
+        logger = logger or defaultLogger
+        total = 0
+        batch = []
+        for path in paths:
+            for record in iter_records(path):
+                batch.append(record)
+                if len(batch) == BUILD_BATCH_SIZE:
+                    total += self.add(batch)
+                    batch = []
+                    logger.info(f"Indexed {total} records", indent_level=1)
+            logger.info(f"Indexed {path}", indent_level=1)
+        total += self.add(batch)
+        return total
+
+    def __len__(self):
+        if not self.exists():
+            return 0
+        return self.db.execute('SELECT COUNT(*) FROM works').fetchone()[0]
+
+index = DumpIndex()
+
+def fetch_by_doi(doi:str):
+    """
+    Look the DOI up in the dump index, and online on a miss
+    """
+    return index.get(doi) or CrossRef.fetch_by_doi(doi)
+
+def prefetch(dois, logger=None):
+    """
+    Resolve DOIs from the dump index, and prefetch the rest online in batches.
+    Returns a dict of DOI to parsed metadata for the DOIs that were resolved.
+    """
+    logger = logger or defaultLogger
+    module_name = __name__.split('.')[-1]
+
+    dois = set(dois)
+    found = index.get_many(dois)
+    logger.info(f"Found {len(found)}/{len(dois)} DOIs in the {module_name} index")
+
+    results = { doi: parse(mdata, logger) for doi, mdata in found.items() }
+    if misses := [ doi for doi in dois if doi not in found ]:
+        results.update(CrossRef.prefetch(misses, logger))
+    return results
+
+@profile.profiled('source.crossref-dump')
+def fetch_and_parse(doi:str, logger=None):
+    """
+    Fetch metadata from the dump index, or CrossRef on a miss, and parse it into a useful dict.
+    """
+    logger = logger or defaultLogger
+    module_name = __name__.split('.')[-1]
+
+    if mdata := index.get(doi):
+        logger.info(f"Fetched metadata from {module_name}", indent_level=1)
+        return parse(mdata, logger)
+
+    return CrossRef.fetch_and_parse(doi, logger)
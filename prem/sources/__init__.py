@@ -0,0 +1,31 @@
+import importlib
+import pkgutil
+
+def source_key(name):
+    """
+    Source names are module names, matched case-insensitively and ignoring dashes
+    and underscores, e.g. crossref-dump for CrossRefDump
+    """
+    return name.lower().replace('-', '').replace('_', '')
+
+class Sources:
+    """
+    Mapping of source name to source module. The modules of this package are found
+    without importing them, and only imported when looked up.
+    """
+
+    def __init__(self):
+        self.modules = dict(sorted((source_key(module.name), module.name) for module in pkgutil.iter_modules(__path__)))
+
+    def __contains__(self, name):
+        return source_key(name) in self.modules
+
+    def __iter__(self):
+        return iter(self.modules)
+
+    def __getitem__(self, name):
+        if name not in self:
+            raise KeyError(name)
+        return importlib.import_module(f"{__name__}.{self.modules[source_key(name)]}")
+
+sources = Sources()
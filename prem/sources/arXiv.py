@@ -1,14 +1,21 @@
-import requests
 from collections import defaultdict
-from joblib import Memory
 import os
 import xml.etree.ElementTree as ET
 import re
-from prem.utils import string_sanitizer
+from prem.utils import string_sanitizer, RequestSpacer
 from prem.logging import defaultLogger
+from prem import http
+from prem.cache import cached, CACHE_DIR
+from prem.matcher import matcher
+from prem import profile
 
-CACHE_DIR = f"{os.environ['HOME']}/.cache/prem"
-memory = Memory(location=CACHE_DIR, verbose=0)
+API_URL = os.environ.get('PREM_ARXIV_API', 'http://export.arxiv.org/api/query')
+
+# arXiv API guidance: no more than one request every 3 seconds
+REQUEST_INTERVAL = 3
+BATCH_SIZE = 100
+
+spacer = RequestSpacer(f"{CACHE_DIR}/arxiv.next", REQUEST_INTERVAL)
 
 arxiv_namespaces = {
         'atom': "http://www.w3.org/2005/Atom"
@@ -20,15 +27,96 @@ arxiv_id_regex_compiled = re.compile(arxiv_id_regex)
 identifier_name = 'arXiv ID'
 identifier_regex = arxiv_id_regex
 identifier_regex_compiled = arxiv_id_regex_compiled
+identifier_kind = 'arxiv'
 
-@memory.cache
-def fetch_metadata_arxiv(id:str):
+# Some extraction engines read the vertical margin stamp backwards ("43210.1032:viXra").
+# Matching the mirrored pattern avoids searching a reversed copy of the text.
+arxiv_id_reversed_regex = r'\d{4,5}\.\d{4}(?=:viXra)'
+
+matcher.register(identifier_kind, identifier_regex)
+matcher.register(identifier_kind, arxiv_id_reversed_regex, transform=lambda match: match[::-1])
+
+def is_missing(feed:str):
+    """
+    True for feeds without a paper entry, including arXiv's error feeds
+    """
+    entry = ET.fromstring(feed).find('atom:entry', arxiv_namespaces)
+    return entry is None or 'api/errors' in (entry.findtext('atom:id', '', arxiv_namespaces))
+
+def strip_version(arxiv_id:str):
+    return re.sub(r'v\d+$', '', arxiv_id)
+
+# Keyed without the version: ids found in pdfs have none, those in dc:identifier do
+@cached('arxiv', normalize=lambda id: strip_version(id.strip()), is_negative=is_missing)
+def fetch_feed_arxiv(id:str):
+    """
+    Fetch the arXiv API feed for a given id as text
+    """
     params = {'search_query': f'id:{id}', 'start': 0, 'max_results': 10}
-    response = requests.get('http://export.arxiv.org/api/query', params=params)
-    # print(response.content)
+    with profile.span('arxiv.wait'):
+        spacer.wait()
+    response = http.get(API_URL, params=params)
+
+    if not response.ok:
+        return f'<feed xmlns="{arxiv_namespaces["atom"]}"/>'
+
+    return response.content.decode('utf-8')
+
+def fetch_metadata_arxiv(id:str):
+    return ET.fromstring(fetch_feed_arxiv(id))
+
+def fetch_metadata_arxiv_batch(ids, batch_size=BATCH_SIZE):
+    """
+    Fetch many ids with id_list requests, spaced out as the arXiv API asks.
+    Returns a dict of id to a feed holding only that id's entry, for the ids that were found.
+    """
+    ids = list(dict.fromkeys(ids))
+    results = {}
+
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        params = {'id_list': ','.join(batch), 'start': 0, 'max_results': len(batch)}
+        with profile.span('arxiv.wait'):
+            spacer.wait()
+        response = http.get(API_URL, params=params)
+
+        if not response.ok:
+            continue
+
+        root = ET.fromstring(response.content)
+        requested = { strip_version(i): i for i in batch }
+        for entry in root.findall('atom:entry', arxiv_namespaces):
+            url = entry.find('atom:id', arxiv_namespaces).text
+            arxiv_id = requested.get(strip_version(re.sub("https?://arxiv.org/abs/", '', url)))
+            if arxiv_id:
+                feed = ET.Element(root.tag)
+                feed.append(entry)
+                results[arxiv_id] = feed
+
+    return results
+
+def prefetch(ids, logger=None):
+    """
+    Resolve all uncached ids in batches and fill the cache with the results so that
+    later calls to fetch_and_parse() for any of them don't need a request.
+    Returns a dict of id to parsed metadata for the ids that were resolved.
+    """
+    logger = logger or defaultLogger
+    module_name = __name__.split('.')[-1]
+
+    ids = list(filter(lambda i: not fetch_feed_arxiv.in_cache(i), set(ids)))
+    if not ids:
+        return {}
+
+    results = fetch_metadata_arxiv_batch(ids)
+    logger.info(f"Prefetched metadata for {len(results)}/{len(ids)} arXiv IDs from {module_name}")
+
+    for arxiv_id, feed in results.items():
+        fetch_feed_arxiv.put(arxiv_id, ET.tostring(feed, encoding='unicode'))
 
-    return ET.fromstring(response.content)
+    return { arxiv_id: parse(feed) for arxiv_id, feed in results.items() }
 
+@profile.profiled('source.arxiv')
 def fetch_and_parse(arxiv_id:str, logger=None):
     """
     Fetch metadata from arXiv based on provided id and parse it into a useful dict.
@@ -0,0 +1,31 @@
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+class SQLiteStore:
+    """
+    Data kept in an SQLite database in WAL mode, shared by threads and worker processes.
+    Subclasses create their tables in setup().
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._local = threading.local()
+
+    @property
+    def db(self):
+        """
+        Connect on first use, once per thread and again in forked processes
+        """
+        if getattr(self._local, 'pid', None) != os.getpid():
+            Path(self.filename).parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.filename, timeout=60, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            self.setup(db)
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return self._local.db
+
+    def setup(self, db):
+        pass
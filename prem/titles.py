@@ -0,0 +1,49 @@
+import difflib
+import fcntl
+import os
+import re
+
+# Matches scoring less are not trusted without review
+THRESHOLD = 0.85
+
+# Weights of the title similarity and of finding the authors and year of a record on the first page
+TITLE_WEIGHT = 0.7
+AUTHOR_WEIGHT = 0.2
+YEAR_WEIGHT = 0.1
+
+def normalize(text):
+    """
+    Lowercase words without punctuation, separated by single spaces
+    """
+    return ' '.join(re.findall(r'\w+', (text or '').lower()))
+
+def similarity(a, b):
+    """
+    Fuzzy similarity of two titles, between 0 and 1
+    """
+    return difflib.SequenceMatcher(None, normalize(a), normalize(b)).ratio()
+
+def score(title, text, record_titles, authors, year):
+    """
+    Confidence between 0 and 1 that a record is the document with the guessed title and first
+    page text: the best title similarity, and whether the family name of one of its authors
+    and its year appear in the text.
+    """
+    words = set(normalize(text).split())
+    title_score = max(map(lambda t: similarity(title, t), record_titles), default=0)
+    author_score = any(normalize(a) and set(normalize(a).split()) <= words for a in authors)
+    year_score = bool(year) and str(year) in words
+    return TITLE_WEIGHT * title_score + AUTHOR_WEIGHT * author_score + YEAR_WEIGHT * year_score
+
+def queue_for_review(fname, review_file):
+    """
+    Append a file to the review list, one path per line, unless it's already listed.
+    Read back with `prem -m manual --files-from review.txt`, which keeps stdin free for prompts.
+    Workers appending at the same time don't interleave their lines.
+    """
+    path = os.path.abspath(fname)
+    with open(review_file, 'a+') as fp:
+        fcntl.flock(fp, fcntl.LOCK_EX)
+        fp.seek(0)
+        if path not in fp.read().splitlines():
+            fp.write(path + '\n')
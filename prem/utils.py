@@ -1,29 +1,61 @@
-import requests
+import errno
+import itertools
 import os
 import re
-from joblib import Memory
+import shutil
 from pathlib import Path
 import subprocess
-import readline
+import fcntl
+import time
 from prem.logging import defaultLogger, get_indent_string
+from prem import http
+from prem.cache import cached, CACHE_DIR
 import re
 
-CACHE_DIR = f"{os.environ['HOME']}/.cache/prem"
-memory = Memory(location=CACHE_DIR, verbose=0)
+DOI_RESOLVER = os.environ.get('PREM_DOI_RESOLVER', 'https://dx.doi.org')
 
-@memory.cache
+class RequestSpacer:
+    """
+    Space out requests by at least `interval` seconds, across all processes sharing `filename`.
+    Each call to wait() reserves the next free slot under a file lock and sleeps until it.
+    """
+
+    def __init__(self, filename, interval):
+        self.filename = filename
+        self.interval = interval
+
+    def wait(self):
+        Path(self.filename).parent.mkdir(parents=True, exist_ok=True)
+        with open(self.filename, 'a+') as fp:
+            fcntl.flock(fp, fcntl.LOCK_EX)
+            fp.seek(0)
+            now = time.time()
+            slot = max(now, float(fp.read() or 0))
+            fp.seek(0)
+            fp.truncate()
+            fp.write(str(slot + self.interval))
+            fcntl.flock(fp, fcntl.LOCK_UN)
+        time.sleep(slot - now)
+
+@cached('bibtex', normalize=lambda doi: doi.strip().lower())
 def fetch_bibliography(doi:str):
     """
     Fetch citation as bibtex string from dx.doi.org for given DOI
     """
     header = {'Accept': 'text/bibliography; style=bibtex'}
-    response = requests.get(f"https://dx.doi.org/{doi}", headers=header)
+    response = http.get(f"{DOI_RESOLVER}/{doi}", headers=header)
 
     if not response.ok: 
         defaultLogger.error(f"Error fetching bibtex for doi: {doi}", indent_level=1)
         return ''
 
     bib_text = response.content.decode('utf-8', 'strict').lstrip()
+    return first_author_key(bib_text)
+
+def first_author_key(bib_text):
+    """
+    Prefix the citation key of an @article entry with the family name of its first author
+    """
     author_match = re.search('(?<=author={)[^}]*(?=})', bib_text)
     if author_match:
         authors = author_match.group(0)
@@ -105,6 +137,7 @@ def input_with_prefill(prompt, text, logger=None, indent_level=0, indent_step=2)
     if text is None:
         return ''
 
+    import readline
     def hook():
         readline.insert_text(text)
         readline.redisplay()
@@ -115,3 +148,29 @@ def input_with_prefill(prompt, text, logger=None, indent_level=0, indent_step=2)
     result = input(prompt)
     readline.set_pre_input_hook()
     return result
+
+def move_without_overwriting(src, dst):
+    """
+    Move src to dst, or to "dst (1)", "dst (2)", ... if dst is taken by another file, and
+    return the name used. Hard linking checks and takes the name in one step, so files
+    renamed to the same name at the same time by other workers are never overwritten.
+    """
+    stem, suffix = os.path.splitext(dst)
+    for n in itertools.count():
+        candidate = f"{stem} ({n}){suffix}" if n else dst
+        if os.path.exists(candidate) and os.path.samefile(src, candidate):
+            return candidate
+        try:
+            os.link(src, candidate)
+        except FileExistsError:
+            continue
+        except OSError as e:
+            # Across filesystems, or on filesystems without hard links
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.ENOTSUP, errno.EMLINK):
+                raise
+            if os.path.exists(candidate):
+                continue
+            shutil.move(src, candidate)
+            return candidate
+        os.unlink(src)
+        return candidate
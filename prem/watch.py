@@ -0,0 +1,230 @@
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import socket
+import socketserver
+import struct
+import time
+from prem.cache import CACHE_DIR
+
+SOCKET_FILE = f"{os.environ.get('XDG_RUNTIME_DIR') or CACHE_DIR}/prem.sock"
+
+# Seconds a file must stay unchanged before it is considered completely written
+SETTLE_TIME = 2.0
+
+# Names used by browsers and download managers while a file is still downloading
+PARTIAL_SUFFIXES = ('.part', '.crdownload', '.download', '.tmp', '.partial')
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct('iIII')
+
+def is_candidate(name):
+    """
+    Whether a file name looks like a finished pdf download
+    """
+    name = os.path.basename(name)
+    return name.lower().endswith('.pdf') and not name.startswith('.') and not name.lower().endswith(PARTIAL_SUFFIXES)
+
+class InotifyWatcher:
+    """
+    Report files created, written to or moved into directories, using inotify through libc
+    """
+
+    def __init__(self, directories):
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.directories = {}
+        for directory in directories:
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"Can't watch {directory}")
+            self.directories[wd] = directory
+
+    def events(self, timeout=None):
+        """
+        Paths with events, waiting at most timeout seconds for the first one
+        """
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        data = os.read(self.fd, 65536)
+        paths = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if name and wd in self.directories:
+                paths.append(os.path.join(self.directories[wd], os.fsdecode(name)))
+        return list(dict.fromkeys(paths))
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    """
+    Report files whose size or modification time changed, by listing directories every
+    interval seconds. Files present at the first listing are not reported.
+    """
+
+    def __init__(self, directories, interval=1.0):
+        self.directories = directories
+        self.interval = interval
+        self.known = self.scan()
+        self.next_scan = time.monotonic() + interval
+
+    def scan(self):
+        found = {}
+        for directory in self.directories:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    found[entry.path] = (stat.st_size, stat.st_mtime_ns)
+        return found
+
+    def events(self, timeout=None):
+        delay = self.next_scan - time.monotonic()
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            return []
+        time.sleep(max(0, delay))
+        self.next_scan = time.monotonic() + self.interval
+        found = self.scan()
+        changed = [ path for path, signature in found.items() if self.known.get(path) != signature ]
+        self.known = found
+        return changed
+
+    def close(self):
+        pass
+
+def watcher(directories, poll=None):
+    """
+    An inotify watcher, or a polling one every `poll` seconds if asked for or if
+    inotify isn't available
+    """
+    if not poll:
+        try:
+            return InotifyWatcher(directories)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(directories, poll or 1.0)
+
+class Debouncer:
+    """
+    Hold changed files until they have stayed the same size for `settle` seconds,
+    so that partial downloads aren't processed.
+    """
+
+    def __init__(self, settle=SETTLE_TIME):
+        self.settle = settle
+        self.pending = {}
+
+    def touch(self, path):
+        try:
+            stat = os.stat(path)
+            self.pending[path] = (time.monotonic(), (stat.st_size, stat.st_mtime_ns))
+        except FileNotFoundError:
+            self.pending.pop(path, None)
+
+    def next_timeout(self):
+        if not self.pending:
+            return None
+        return max(0, min(t for t, _ in self.pending.values()) + self.settle - time.monotonic())
+
+    def due(self):
+        """
+        Files that stayed unchanged for the settle time. Files that disappeared are dropped.
+        """
+        now = time.monotonic()
+        ready = []
+        for path, (touched, signature) in list(self.pending.items()):
+            if now - touched < self.settle:
+                continue
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                del self.pending[path]
+                continue
+            current = (stat.st_size, stat.st_mtime_ns)
+            if current == signature and stat.st_size > 0:
+                del self.pending[path]
+                ready.append(path)
+            else:
+                # Check again after another settle time
+                self.pending[path] = (now, current)
+        return ready
+
+def watch(directories, settle=SETTLE_TIME, poll=None):
+    """
+    Yield pdfs that appear or are written in directories, once they are completely written
+    """
+    source = watcher(directories, poll)
+    debouncer = Debouncer(settle)
+    try:
+        while True:
+            for path in source.events(debouncer.next_timeout()):
+                if is_candidate(path):
+                    debouncer.touch(path)
+            yield from debouncer.due()
+    finally:
+        source.close()
+
+class SubmitHandler(socketserver.StreamRequestHandler):
+    """
+    Read a JSON request {"files": [...]} and answer one JSON line per file
+    """
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            for result in self.server.process(request['files']):
+                self.wfile.write(json.dumps(result).encode() + b'\n')
+                self.wfile.flush()
+        except (ValueError, KeyError) as e:
+            self.wfile.write(json.dumps({'error': f"Bad request: {e}"}).encode() + b'\n')
+
+class SubmitServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Unix socket server passing submitted files to process(files), which yields result dicts
+    """
+    daemon_threads = True
+
+    def __init__(self, filename, process):
+        if os.path.exists(filename):
+            try:
+                with socket.socket(socket.AF_UNIX) as client:
+                    client.connect(filename)
+                raise RuntimeError(f"Another prem watch is listening on {filename}")
+            except ConnectionRefusedError:
+                os.unlink(filename)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        self.process = process
+        super().__init__(filename, SubmitHandler)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+def submit(files, filename=SOCKET_FILE):
+    """
+    Send files to a running prem watch and yield its results as they come
+    """
+    with socket.socket(socket.AF_UNIX) as client:
+        client.connect(filename)
+        client.sendall(json.dumps({'files': list(map(os.path.abspath, files))}).encode() + b'\n')
+        with client.makefile('rb') as fp:
+            for line in fp:
+                yield json.loads(line)
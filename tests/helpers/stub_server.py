@@ -0,0 +1,134 @@
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, unquote
+
+def crossref_record(doi, title='A title', family='Doe', year=2020):
+    """
+    Minimal CrossRef works record with every field CrossRef.parse() reads
+    """
+    return {
+            'DOI': doi,
+            'type': 'journal-article',
+            'title': [title],
+            'container-title': ['Journal of Tests'],
+            'author': [{'given': 'Jane', 'family': family, 'sequence': 'first'}],
+            'subject': [],
+            'volume': '1',
+            'page': '1-10',
+            'issued': {'date-parts': [[year, 1, 1]]},
+            'publisher': 'Test Publisher',
+            'ISSN': ['1234-5678'],
+            'URL': f"https://doi.org/{doi}",
+            'content-domain': {'domain': []},
+            }
+
+def arxiv_entry(arxiv_id, title='A title', authors=('Jane Doe',), year=2020):
+    """
+    Atom entry as returned by the arXiv API for a single paper
+    """
+    authors = ''.join(f"<author><name>{author}</name></author>" for author in authors)
+    return (f"<entry><id>http://arxiv.org/abs/{arxiv_id}v1</id>"
+            f"<published>{year}-01-01T00:00:00Z</published>"
+            f"<title>{title}</title>{authors}</entry>")
+
+def bibtex_entry(record):
+    """
+    BibTeX as returned by dx.doi.org for a CrossRef works record
+    """
+    author = record['author'][0]
+    year = record['issued']['date-parts'][0][0]
+    return (f" @article{{{author['family']}_{year}, title={{{record['title'][0]}}}, "
+            f"author={{{author['family']}, {author['given']}}}, year={{{year}}}, DOI={{{record['DOI']}}}}}\n")
+
+class StubServer:
+    """
+    Local stand-in for the CrossRef, arXiv and dx.doi.org APIs serving records from dicts.
+    Every request path is recorded in `requests`. The first `failures` requests
+    are answered with 429 and a Retry-After header. Every response is delayed by
+    `latency` seconds.
+    """
+
+    def __init__(self, records=None, arxiv_records=None, failures=0, latency=0):
+        self.records = records or {}
+        self.arxiv_records = arxiv_records or {}
+        self.failures = failures
+        self.latency = latency
+        self.requests = []
+
+        stub = self
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests.append(self.path)
+                time.sleep(stub.latency)
+                if len(stub.requests) <= stub.failures:
+                    self.send_response(429)
+                    self.send_header('Retry-After', '0')
+                    self.end_headers()
+                    return
+                status, content_type, body = stub.handle(self.path)
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle(self, path):
+        url = urlparse(path)
+
+        if url.path == '/api/query':
+            return self.handle_arxiv(parse_qs(url.query))
+
+        if url.path.startswith('/10.'):
+            return self.handle_doi(unquote(url.path[1:]))
+
+        status, body = self.handle_crossref(url)
+        return status, 'application/json', json.dumps(body).encode()
+
+    def handle_arxiv(self, query):
+        if 'id_list' in query:
+            ids = query['id_list'][0].split(',')
+        else:
+            ids = [ query['search_query'][0][len('id:'):] ]
+        entries = ''.join(self.arxiv_records[i] for i in ids if i in self.arxiv_records)
+        feed = f'<feed xmlns="http://www.w3.org/2005/Atom">{entries}</feed>'
+        return 200, 'application/atom+xml', feed.encode()
+
+    def handle_doi(self, doi):
+        records = { doi.lower(): record for doi, record in self.records.items() }
+        if doi.lower() in records:
+            return 200, 'application/x-bibtex', bibtex_entry(records[doi.lower()]).encode()
+        return 404, 'text/plain', b'DOI Not Found'
+
+    def handle_crossref(self, url):
+        records = { doi.lower(): record for doi, record in self.records.items() }
+
+        if url.path == '/works':
+            query = parse_qs(url.query)
+            if 'filter' in query:
+                dois = [ f[len('doi:'):].lower() for f in query['filter'][0].split(',') ]
+                items = [ records[doi] for doi in dois if doi in records ]
+            else:
+                items = list(records.values())
+            return 200, {'message': {'items': items}}
+
+        if url.path.startswith('/works/'):
+            doi = unquote(url.path[len('/works/'):]).lower()
+            if doi in records:
+                return 200, {'message': records[doi]}
+
+        return 404, {}
@@ -30,3 +30,23 @@ def get_pdf(key, filename=None, headers=None):
     shutil.copy(cachefile, filename)
 
     return filename
+
+def make_pdf(texts, filename=None):
+    """
+    Build a small pdf locally with one page per string in texts.
+    Useful for tests that shouldn't depend on downloads.
+    """
+    from pikepdf import Pdf, Dictionary, Name
+
+    filename = filename if filename else f"/tmp/prem/{next(tempfile._get_candidate_names())}.pdf"
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+    pdf = Pdf.new()
+    font = pdf.make_indirect(Dictionary(Type=Name.Font, Subtype=Name.Type1, BaseFont=Name.Helvetica))
+    for text in texts:
+        page = pdf.add_blank_page(page_size=(612, 792))
+        page.Resources = Dictionary(Font=Dictionary(F1=font))
+        page.Contents = pdf.make_stream(f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode())
+    pdf.save(filename)
+
+    return filename
@@ -0,0 +1,44 @@
+from prem.sources import arXiv
+from prem.cache import MetadataCache
+import prem.cache
+from prem.utils import RequestSpacer
+import os
+import sys
+import time
+import random
+
+# FIXME:
+sys.path.append(os.path.join(os.path.dirname(__file__), 'helpers'))
+from helpers.stub_server import StubServer, arxiv_entry
+
+def test_request_spacer(tmp_path):
+    spacer = RequestSpacer(str(tmp_path / 'next'), 0.2)
+    start = time.time()
+    for _ in range(3):
+        spacer.wait()
+    assert time.time() - start >= 0.4
+
+def test_batch_prefetch(monkeypatch, tmp_path):
+    # Random ids so that earlier runs haven't cached them
+    ids = [ f"{random.randint(1000, 9999)}.{random.randint(10000, 99999)}" for _ in range(3) ]
+    records = { i: arxiv_entry(i, title=f"Title {n}", authors=['Jane Doe', 'John Roe']) for n, i in enumerate(ids) }
+
+    monkeypatch.setattr(prem.cache, 'cache', MetadataCache(str(tmp_path / 'cache.sqlite')))
+
+    with StubServer(arxiv_records=records) as stub:
+        monkeypatch.setattr(arXiv, 'API_URL', f"{stub.url}/api/query")
+        monkeypatch.setattr(arXiv, 'spacer', RequestSpacer(str(tmp_path / 'next'), 0.01))
+
+        feeds = arXiv.fetch_metadata_arxiv_batch(ids + ['0000.00000'], batch_size=2)
+        assert sorted(feeds) == sorted(ids)
+        assert len(stub.requests) == 2
+
+        stub.requests.clear()
+        parsed = arXiv.prefetch(ids)
+        assert parsed[ids[2]]['dc:title'] == 'Title 2'
+        assert parsed[ids[2]]['prem:author'] == 'Doe'
+
+        # Later lookups are served from the cache
+        stub.requests.clear()
+        assert arXiv.fetch_and_parse(ids[0])['dc:identifier'] == f"arXiv:{ids[0]}v1"
+        assert not stub.requests
@@ -0,0 +1,124 @@
+from prem.bibtex import crossref_to_bibtex, crossref_to_csl, arxiv_to_bibtex, arxiv_to_csl, bibliography, bib_format, BibWriter
+from prem.sources import CrossRef, arXiv
+from prem.cache import MetadataCache
+import prem.cache
+import prem.utils
+import xml.etree.ElementTree as ET
+import json
+import os
+import sys
+
+# FIXME:
+sys.path.append(os.path.join(os.path.dirname(__file__), 'helpers'))
+from helpers.stub_server import StubServer, crossref_record, arxiv_entry
+
+def hawking():
+    record = crossref_record('10.1103/PhysRevD.13.191', title='Black holes and thermodynamics', family='Hawking', year=1976)
+    record.update({
+        'author': [{'given': 'S. W.', 'family': 'Hawking', 'sequence': 'first'}],
+        'container-title': ['Physical Review D'],
+        'publisher': 'American Physical Society (APS)',
+        'volume': '13',
+        'issue': '2',
+        'page': '191-197',
+        'issued': {'date-parts': [[1976, 1, 15]]},
+        'ISSN': ['0556-2821'],
+        })
+    return record
+
+def test_crossref_to_bibtex():
+    bib = crossref_to_bibtex(hawking())
+    # Same key as the dx.doi.org entry after the first author rewrite
+    assert bib.startswith('@article{HawkingHawking_1976, title={Black holes and thermodynamics}, volume={13}, ')
+    assert 'author={Hawking, S. W.}' in bib
+    assert 'journal={Physical Review D}' in bib
+    assert 'month=jan, pages={191-197}}' in bib
+    assert bib.endswith('}\n')
+
+def test_crossref_to_bibtex_escaping():
+    record = crossref_record('10.5555/x', title='Rock &amp; <i>roll</i> at 100%')
+    record['type'] = 'proceedings-article'
+    bib = crossref_to_bibtex(record)
+    assert bib.startswith('@inproceedings{Doe_2020, ')
+    assert r'title={Rock \& roll at 100\%}' in bib
+
+def test_crossref_to_csl():
+    item = crossref_to_csl(hawking())
+    assert item['type'] == 'article-journal'
+    assert item['author'] == [{'family': 'Hawking', 'given': 'S. W.'}]
+    assert item['issued'] == {'date-parts': [[1976, 1, 15]]}
+    assert item['container-title'] == 'Physical Review D'
+
+def test_arxiv_render():
+    root = ET.fromstring(f'<feed xmlns="http://www.w3.org/2005/Atom">{arxiv_entry("2101.12345", authors=("Jane Doe", "John Q. Public"))}</feed>')
+    bib = arxiv_to_bibtex(root)
+    assert bib.startswith('@misc{Doe_2020, title={A title}, url={https://arxiv.org/abs/2101.12345v1}, author={Doe, Jane and Public, John Q.}')
+    assert 'eprint={2101.12345}' in bib
+    assert arxiv_to_csl(root)['author'][1] == {'family': 'Public', 'given': 'John Q.'}
+
+def test_bibliography_from_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(prem.cache, 'cache', MetadataCache(str(tmp_path / 'cache.sqlite')))
+    doi = '10.5555/bib'
+    with StubServer({doi: crossref_record(doi)}) as stub:
+        monkeypatch.setattr(CrossRef, 'API_URL', stub.url)
+        monkeypatch.setattr(prem.utils, 'DOI_RESOLVER', stub.url)
+
+        CrossRef.fetch_and_parse(doi)
+        stub.requests.clear()
+        assert bibliography(doi).startswith('@article{DoeDoe_2020,')
+        assert bibliography(doi, fmt='csl-json')['DOI'] == doi
+        assert not stub.requests
+
+        # Network bibtex only when there is no record to render
+        monkeypatch.setattr(CrossRef, 'fetch_metadata_crossref', lambda doi: {})
+        assert bibliography(doi).startswith('@article{DoeDoe_2020,')
+        assert stub.requests == [f"/{doi}"]
+
+def test_bibliography_arxiv_from_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(prem.cache, 'cache', MetadataCache(str(tmp_path / 'cache.sqlite')))
+    with StubServer(arxiv_records={'2101.12345': arxiv_entry('2101.12345')}) as stub:
+        monkeypatch.setattr(arXiv, 'API_URL', f"{stub.url}/api/query")
+        monkeypatch.setattr(arXiv, 'spacer', prem.utils.RequestSpacer(str(tmp_path / 'next'), 0.01))
+
+        arXiv.prefetch(['2101.12345'])
+        stub.requests.clear()
+        # Entries are built for the versioned id in dc:identifier, from what was fetched for the id in the pdf
+        assert 'eprint={2101.12345}' in bibliography(None, '2101.12345v1')
+        assert bibliography(None, '2101.12345v1', fmt='csl-json')['id'] == 'arXiv:2101.12345'
+        assert not stub.requests
+
+def test_bib_writer(tmp_path):
+    bib = tmp_path / 'ref.bib'
+    bib.write_text('@article{DoeDoe_2020, title={Old}, DOI={10.5555/OLD}}\n@misc{Other, title={No identifier}}')
+
+    writer = BibWriter(bib)
+    assert writer.keys == {'DoeDoe_2020', 'Other'}
+    # Already in the file, and already collected
+    assert not writer.add(crossref_to_bibtex(crossref_record('10.5555/old')))
+    assert writer.add(crossref_to_bibtex(crossref_record('10.5555/b', title='B')))
+    assert not writer.add(crossref_to_bibtex(crossref_record('10.5555/B', title='B')))
+    assert writer.add(crossref_to_bibtex(crossref_record('10.5555/a', title='A')))
+    assert not writer.add(None)
+    assert writer.flush() == 2
+
+    text = bib.read_text()
+    assert text.count('@') == 4
+    # Colliding keys get suffixes in identifier order, whatever order entries came in
+    assert 'No identifier}}\n@article{DoeDoe_2020a, title={A}' in text
+    assert '@article{DoeDoe_2020b, title={B}' in text
+
+    # A second run only adds what is new
+    with BibWriter(bib) as writer:
+        writer.add(crossref_to_bibtex(crossref_record('10.5555/a', title='A')))
+        writer.add(crossref_to_bibtex(crossref_record('10.5555/c', title='C')))
+    assert bib.read_text().count('@') == 5
+    assert '@article{DoeDoe_2020c, title={C}' in bib.read_text()
+
+def test_bib_writer_csl(tmp_path):
+    csl = tmp_path / 'refs.json'
+    assert bib_format(csl) == 'csl-json'
+    for _ in range(2):
+        with BibWriter(csl) as writer:
+            writer.add(crossref_to_csl(crossref_record('10.5555/a')))
+            writer.add(crossref_to_csl(crossref_record('10.5555/b')))
+    assert list(map(lambda item: item['id'], json.loads(csl.read_text()))) == ['10.5555/a', '10.5555/b']
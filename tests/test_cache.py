@@ -0,0 +1,53 @@
+from prem.cache import MetadataCache, cached
+import prem.cache
+import time
+
+def test_cache_ttl(tmp_path):
+    cache = MetadataCache(str(tmp_path / 'cache.sqlite'), positive_ttl=60, negative_ttl=0.1)
+    cache.put('crossref', '10.1038/nrn1907', {'title': ['Neuroscience and education']})
+    cache.put('crossref', '10.5555/missing', {}, negative=True)
+
+    assert cache.get('crossref', '10.1038/nrn1907') == (True, {'title': ['Neuroscience and education']})
+    assert cache.get('crossref', '10.5555/missing') == (True, {})
+    assert cache.get('arxiv', '10.1038/nrn1907') == (False, None)
+
+    # Negative entries expire sooner
+    time.sleep(0.2)
+    assert cache.get('crossref', '10.5555/missing') == (False, None)
+    assert cache.stats()['crossref'] == {'entries': 2, 'negative': 1, 'expired': 1, 'size': 43}
+    assert cache.prune() == 1
+    assert cache.hits == 2 and cache.misses == 2
+
+    cache.clear()
+    assert cache.stats() == {}
+
+def test_cache_lru(tmp_path):
+    cache = MetadataCache(str(tmp_path / 'cache.sqlite'), max_size=30)
+    for key in ['a', 'b', 'c']:
+        cache.put('test', key, '0123456789')
+        time.sleep(0.01)
+    cache.get('test', 'a')
+
+    # 'b' is the least recently used
+    assert cache.prune() == 1
+    assert cache.contains('test', 'a')
+    assert not cache.contains('test', 'b')
+    assert cache.contains('test', 'c')
+
+def test_cached(monkeypatch, tmp_path):
+    monkeypatch.setattr(prem.cache, 'cache', MetadataCache(str(tmp_path / 'cache.sqlite')))
+    calls = []
+
+    @cached('test', normalize=lambda key: key.lower())
+    def fetch(key):
+        calls.append(key)
+        return {'key': key}
+
+    assert fetch('ABC') == {'key': 'ABC'}
+    assert fetch('abc') == {'key': 'ABC'}
+    assert calls == ['ABC']
+
+    fetch.put('xyz', {'key': 'prefetched'})
+    assert fetch.in_cache('XYZ')
+    assert fetch('XYZ') == {'key': 'prefetched'}
+    assert calls == ['ABC']
@@ -0,0 +1,50 @@
+from prem import PDF
+from prem.catalog import Catalog
+import os
+import shutil
+import sys
+
+# FIXME:
+sys.path.append(os.path.join(os.path.dirname(__file__), 'helpers'))
+from helpers.utils import make_pdf
+
+def test_catalog_roundtrip(tmp_path):
+    filename = make_pdf(['DOI 10.1038/nrn1907'])
+    catalog = Catalog(str(tmp_path / 'catalog.sqlite'))
+
+    assert catalog.lookup(filename) is None
+
+    pdf = PDF(filename)
+    pdf.update_metadata({'dc:identifier': 'doi:10.1038/nrn1907', 'prem:title': 'Neuroscience and education', 'dc:subject': {'a'}})
+    pdf.write()
+    catalog.record(pdf.filename, pdf.metadata_updates)
+
+    entry = catalog.lookup(filename)
+    assert entry['identifier'] == '10.1038/nrn1907'
+    assert entry['source'] == 'crossref'
+    assert entry['metadata']['prem:title'] == 'Neuroscience and education'
+
+    # Moved files are found by content hash
+    moved = filename + '.moved.pdf'
+    shutil.move(filename, moved)
+    assert catalog.lookup(moved)['identifier'] == '10.1038/nrn1907'
+
+    # Changed files are not
+    with open(moved, 'ab') as fp:
+        fp.write(b'\n')
+    assert catalog.lookup(moved) is None
+
+    catalog.close()
+    os.remove(moved)
+
+def test_catalog_arxiv_version(tmp_path):
+    filename = make_pdf(['arXiv:2101.12345v2'])
+    catalog = Catalog(str(tmp_path / 'catalog.sqlite'))
+
+    # Stored without the version, like the identifiers claimed for duplicates
+    catalog.record(filename, {'dc:identifier': 'arXiv:2101.12345v2'})
+    assert catalog.lookup(filename)['identifier'] == '2101.12345'
+    assert catalog.paths('2101.12345') == [os.path.abspath(filename)]
+
+    catalog.close()
+    os.remove(filename)
@@ -1,4 +1,14 @@
 from prem.sources import CrossRef
+from prem.cache import MetadataCache
+import prem.cache
+import prem.http
+import os
+import sys
+import uuid
+
+# FIXME:
+sys.path.append(os.path.join(os.path.dirname(__file__), 'helpers'))
+from helpers.stub_server import StubServer, crossref_record
 
 def test_crossref_doi():
     mdata = CrossRef.fetch_by_doi('10.52586/4948')
@@ -12,3 +22,73 @@ def test_fetch_and_parse():
     assert mdata['dc:creator'] == ['S. W. Hawking']
     assert mdata['dc:subject'] == set()
     assert mdata['crossmark:DOI'].lower() == doi.lower()
+
+def test_batch_prefetch(monkeypatch, tmp_path):
+    run = uuid.uuid4().hex
+    dois = [ f"10.5555/prem-{run}-{i}" for i in range(5) ]
+    records = { doi: crossref_record(doi.upper(), title=f"Title {i}") for i, doi in enumerate(dois) }
+
+    monkeypatch.setattr(prem.cache, 'cache', MetadataCache(str(tmp_path / 'cache.sqlite')))
+
+    with StubServer(records) as stub:
+        monkeypatch.setattr(CrossRef, 'API_URL', stub.url)
+
+        parsed = CrossRef.fetch_metadata_crossref_batch(dois + ['10.5555/missing'], batch_size=2)
+        assert sorted(parsed) == dois
+        assert len(stub.requests) == 3
+
+        stub.requests.clear()
+        parsed = CrossRef.prefetch(dois)
+        assert parsed[dois[3]]['dc:title'] == 'Title 3'
+
+        # Later lookups are served from the cache
+        stub.requests.clear()
+        assert CrossRef.fetch_and_parse(dois[1])['dc:title'] == 'Title 1'
+        assert not stub.requests
+
+def test_fetch_failure_not_cached(monkeypatch, tmp_path):
+    records = { '10.5555/busy': crossref_record('10.5555/busy', title='Busy') }
+    monkeypatch.setattr(prem.cache, 'cache', MetadataCache(str(tmp_path / 'cache.sqlite')))
+
+    # Every attempt is rate limited: nothing is cached, and the next call tries again
+    with StubServer(records, failures=prem.http.RETRIES + 1) as stub:
+        monkeypatch.setattr(CrossRef, 'API_URL', stub.url)
+        assert not CrossRef.fetch_and_parse('10.5555/busy')
+        assert not CrossRef.fetch_metadata_crossref.in_cache('10.5555/busy')
+        assert CrossRef.fetch_and_parse('10.5555/busy')['dc:title'] == 'Busy'
+
+        # An unknown DOI is cached as missing
+        requests = len(stub.requests)
+        assert not CrossRef.fetch_and_parse('10.5555/missing')
+        assert not CrossRef.fetch_and_parse('10.5555/missing')
+        assert len(stub.requests) == requests + 1
+
+def test_query_cached(monkeypatch, tmp_path):
+    records = { '10.5555/query': crossref_record('10.5555/query', title='Deep gravity') }
+    monkeypatch.setattr(prem.cache, 'cache', MetadataCache(str(tmp_path / 'cache.sqlite')))
+
+    with StubServer(records) as stub:
+        monkeypatch.setattr(CrossRef, 'API_URL', stub.url)
+        assert CrossRef.query('Deep+Gravity')[0]['DOI'] == '10.5555/query'
+        # The same words, however they are joined, are served from the cache
+        assert CrossRef.query('deep gravity ')[0]['DOI'] == '10.5555/query'
+        assert len(stub.requests) == 1
+
+def test_match_title(monkeypatch, tmp_path):
+    records = {
+            '10.5555/gravity': crossref_record('10.5555/gravity', title='Deep gravity', family='Newton', year=1687),
+            '10.5555/other': crossref_record('10.5555/other', title='Shallow levity'),
+            }
+    monkeypatch.setattr(prem.cache, 'cache', MetadataCache(str(tmp_path / 'cache.sqlite')))
+
+    with StubServer(records) as stub:
+        monkeypatch.setattr(CrossRef, 'API_URL', stub.url)
+        text = 'Deep Gravity\nI. Newton\nPublished 1687'
+
+        mdata, score = CrossRef.match_title('Deep Gravity', text)
+        assert mdata['prism3:doi'] == '10.5555/gravity' and round(score, 2) == 1
+
+        # Without the author and year on the page, the title alone isn't enough
+        mdata, score = CrossRef.match_title('Deep Gravity', 'Deep Gravity')
+        assert mdata is None and 0.69 < score < 0.71
+        assert CrossRef.match_title('Deep Gravity', 'Deep Gravity', threshold=0.6)[0]['prism3:doi'] == '10.5555/gravity'
@@ -0,0 +1,60 @@
+from prem.sources import CrossRef, CrossRefDump
+from prem.cache import MetadataCache
+import prem.cache
+import gzip
+import json
+import os
+import sys
+
+# FIXME:
+sys.path.append(os.path.join(os.path.dirname(__file__), 'helpers'))
+from helpers.stub_server import StubServer, crossref_record
+
+def write_dump(directory):
+    """
+    A public data dump file, a gzipped JSONL file of API responses and a plain JSONL file
+    """
+    os.makedirs(directory / 'dump')
+    with gzip.open(directory / 'dump' / '0.json.gz', 'wt') as fp:
+        json.dump({'items': [ crossref_record(f"10.5555/dump-{i}", title=f"Title {i}") for i in range(3) ]}, fp)
+    with gzip.open(directory / 'dump' / '1.jsonl.gz', 'wt') as fp:
+        fp.write(json.dumps({'message': crossref_record('10.5555/DUMP-3', title='Title 3')}) + '\n\n')
+    with open(directory / 'extra.jsonl', 'w') as fp:
+        fp.write(json.dumps(crossref_record('10.5555/dump-4', title='Title 4')) + '\n')
+    return [ directory / 'dump', directory / 'extra.jsonl' ]
+
+def test_dump_index(tmp_path):
+    index = CrossRefDump.DumpIndex(str(tmp_path / 'index.sqlite'))
+    assert index.get('10.5555/dump-0') is None
+
+    assert index.build(write_dump(tmp_path)) == 5
+    assert len(index) == 5
+    assert index.get('10.5555/dump-3')['title'] == ['Title 3']
+    assert index.get(' 10.5555/DUMP-1')['title'] == ['Title 1']
+    assert sorted(index.get_many(['10.5555/dump-2', '10.5555/DUMP-4', '10.5555/missing'])) == ['10.5555/DUMP-4', '10.5555/dump-2']
+
+    # Building again replaces records
+    assert index.build(write_dump(tmp_path / 'again')) == 5
+    assert len(index) == 5
+
+def test_dump_fallback(monkeypatch, tmp_path):
+    index = CrossRefDump.DumpIndex(str(tmp_path / 'index.sqlite'))
+    index.build(write_dump(tmp_path))
+    monkeypatch.setattr(CrossRefDump, 'index', index)
+    monkeypatch.setattr(prem.cache, 'cache', MetadataCache(str(tmp_path / 'cache.sqlite')))
+
+    with StubServer({'10.5555/online': crossref_record('10.5555/online', title='Online')}) as stub:
+        monkeypatch.setattr(CrossRef, 'API_URL', stub.url)
+
+        assert CrossRefDump.fetch_and_parse('10.5555/dump-2')['dc:title'] == 'Title 2'
+        assert not stub.requests
+
+        assert CrossRefDump.fetch_and_parse('10.5555/online')['dc:title'] == 'Online'
+        assert len(stub.requests) == 1
+
+        # Only the DOIs missing from the index are prefetched online
+        stub.requests.clear()
+        parsed = CrossRefDump.prefetch(['10.5555/dump-0', '10.5555/dump-4', '10.5555/online', '10.5555/other'])
+        assert sorted(parsed) == ['10.5555/dump-0', '10.5555/dump-4']
+        assert len(stub.requests) == 1
+        assert 'dump' not in stub.requests[0]
@@ -0,0 +1,37 @@
+from prem.discovery import find_pdfs, is_pdf, walk
+import io
+import os
+
+def make_library(root):
+    for path in ['a/one.pdf', 'a/b/two.PDF', 'a/b/notes.txt', 'c/three.pdf', '.trash/old.pdf', 'fake.pdf']:
+        os.makedirs(root / os.path.dirname(path), exist_ok=True)
+        (root / path).write_bytes(b'not a pdf' if path in ['fake.pdf', 'a/b/notes.txt'] else b'junk\n%PDF-1.7\n')
+    os.symlink(root / 'a', root / 'c' / 'loop')
+
+def test_find_pdfs(tmp_path):
+    make_library(tmp_path)
+    root = str(tmp_path)
+    rel = lambda paths: [ os.path.relpath(p, root) for p in paths ]
+
+    assert is_pdf(tmp_path / 'a' / 'one.pdf') and not is_pdf(tmp_path / 'fake.pdf') and not is_pdf(tmp_path / 'missing.pdf')
+    assert rel(walk(root, ['.trash'])) == ['fake.pdf', 'a/one.pdf', 'a/b/notes.txt', 'a/b/two.PDF', 'c/three.pdf']
+
+    assert rel(find_pdfs([root])) == ['.trash/old.pdf', 'a/one.pdf', 'a/b/two.PDF', 'c/three.pdf']
+    assert rel(find_pdfs([root], exclude=['.trash', '*/b/*'])) == ['a/one.pdf', 'c/three.pdf']
+    assert rel(find_pdfs([root], include=['*.txt', 'one.*'])) == ['a/one.pdf']
+
+    # Files are taken as given, and - reads paths from stdin
+    stdin = io.StringIO(f"{root}/c\n{root}/fake.pdf\n\n{root}/missing.pdf\n")
+    assert rel(find_pdfs([f"{root}/a/b/two.PDF", '-'], stdin=stdin)) == ['a/b/two.PDF', 'c/three.pdf']
+
+    # --files-from lists are read after the inputs, leaving stdin alone
+    listing = tmp_path / 'review.txt'
+    listing.write_text(f"{root}/c/three.pdf\n{root}/missing.pdf\n")
+    assert rel(find_pdfs([f"{root}/a/one.pdf"], stdin=io.StringIO("unread\n"), files_from=[str(listing)])) == ['a/one.pdf', 'c/three.pdf']
+
+def test_find_pdfs_lazy(tmp_path):
+    make_library(tmp_path)
+    def paths():
+        yield str(tmp_path / 'a' / 'one.pdf')
+        raise AssertionError("Read ahead")
+    assert next(find_pdfs(['-'], stdin=paths())) == str(tmp_path / 'a' / 'one.pdf')
@@ -0,0 +1,77 @@
+from prem.duplicates import ContentIndex, DuplicateIndex, partial_hash, skip_copies
+from prem.utils import move_without_overwriting
+from multiprocessing import Pool
+import os
+
+def claim(args):
+    filename, identifier, fname = args
+    return DuplicateIndex(filename).claim(identifier, fname)
+
+def test_content_index(tmp_path):
+    head, tail = os.urandom(1 << 17), os.urandom(1 << 17)
+    files = {
+            'a.pdf': head + b'1' + tail,
+            'b.pdf': head + b'2' + tail,  # same size, ends and partial hash
+            'c.pdf': head + b'1' + tail,
+            'd.pdf': b'small',
+            }
+    for name, data in files.items():
+        (tmp_path / name).write_bytes(data)
+    paths = { name: str(tmp_path / name) for name in files }
+
+    assert partial_hash(paths['a.pdf']) == partial_hash(paths['b.pdf']) != partial_hash(paths['d.pdf'])
+
+    contents = ContentIndex()
+    assert list(map(contents.original, paths.values())) == [None, None, paths['a.pdf'], None]
+
+    # An earlier file changed since it was seen can't be compared any more
+    contents = ContentIndex()
+    contents.original(paths['a.pdf'])
+    with open(paths['a.pdf'], 'ab') as fp:
+        fp.write(b'%%EOF\n')
+    assert contents.original(paths['c.pdf']) is None
+
+def test_skip_copies(tmp_path):
+    for name, data in [('a.pdf', b'%PDF-a'), ('b.pdf', b'%PDF-b'), ('copy.pdf', b'%PDF-a')]:
+        (tmp_path / name).write_bytes(data)
+    a, b, copy = map(lambda n: str(tmp_path / n), ['a.pdf', 'b.pdf', 'copy.pdf'])
+
+    index = DuplicateIndex()
+    try:
+        assert list(skip_copies([a, b, copy], index, 'link')) == [a, b]
+        assert os.path.samefile(a, copy)
+        assert index.duplicates() == [(copy, a, 'same content')]
+    finally:
+        index.remove()
+    assert not os.path.exists(index.filename)
+
+def test_duplicate_index(tmp_path):
+    index = DuplicateIndex(str(tmp_path / 'claims.sqlite'))
+    first = str(tmp_path / 'first.pdf')
+
+    # Workers claiming the same identifier at once: exactly one of them gets it
+    tasks = [ (index.filename, 'doi:10.1/X', str(tmp_path / f"{n}.pdf")) for n in range(8) ]
+    with Pool(4) as pool:
+        originals = pool.map(claim, tasks)
+    assert originals.count(None) == 1 and len(set(originals)) == 2
+
+    assert index.claim('arxiv:2101.00001', first) is None
+    assert index.claim(' ARXIV:2101.00001 ', first) is None
+    assert index.claim('arxiv:2101.00001', tmp_path / 'second.pdf') == first
+
+    index.moved(first, tmp_path / 'renamed.pdf')
+    assert (str(tmp_path / 'second.pdf'), str(tmp_path / 'renamed.pdf'), 'arxiv:2101.00001') in index.duplicates()
+
+def test_move_without_overwriting(tmp_path):
+    for name in ['a.pdf', 'b.pdf', 'target.pdf']:
+        (tmp_path / name).write_text(name)
+    target = str(tmp_path / 'target.pdf')
+
+    assert move_without_overwriting(str(tmp_path / 'a.pdf'), target) == str(tmp_path / 'target (1).pdf')
+    assert move_without_overwriting(str(tmp_path / 'b.pdf'), target) == str(tmp_path / 'target (2).pdf')
+    assert (tmp_path / 'target.pdf').read_text() == 'target.pdf'
+    assert (tmp_path / 'target (2).pdf').read_text() == 'b.pdf'
+    assert not (tmp_path / 'a.pdf').exists()
+
+    # Moving a file to its own name leaves it alone
+    assert move_without_overwriting(target, target) == target
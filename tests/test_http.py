@@ -0,0 +1,31 @@
+from prem import http
+import asyncio
+import os
+import sys
+
+# FIXME:
+sys.path.append(os.path.join(os.path.dirname(__file__), 'helpers'))
+from helpers.stub_server import StubServer, crossref_record
+
+def test_retry_after():
+    doi = '10.5555/prem-http'
+    with StubServer({doi: crossref_record(doi)}, failures=2) as stub:
+        response = http.get(f"{stub.url}/works/{doi}")
+        assert response.ok
+        assert response.json()['message']['DOI'] == doi
+        assert len(stub.requests) == 3
+        assert http.session(stub.url) is http.session(f"{stub.url}/works")
+
+def test_retries_exhausted():
+    with StubServer(failures=5) as stub:
+        response = http.get(f"{stub.url}/works/10.5555/x", retries=1)
+        assert response.status_code == 429
+        assert len(stub.requests) == 2
+
+def test_aget():
+    doi = '10.5555/prem-http'
+    with StubServer({doi: crossref_record(doi)}) as stub:
+        async def fetch_all():
+            return await asyncio.gather(*[ http.aget(f"{stub.url}/works/{doi}") for _ in range(4) ])
+        responses = asyncio.run(fetch_all())
+        assert all(r.ok for r in responses)
@@ -0,0 +1,43 @@
+from prem.logging import QueueLogger, GroupingHandler
+from queue import Queue
+import logging
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+def test_grouped_queue_logging():
+    queue = Queue()
+    a = QueueLogger('prem', 'a.pdf', queue)
+    b = QueueLogger('prem', 'b.pdf', queue)
+
+    a.info("Processing: a.pdf")
+    b.info("Processing: b.pdf")
+    a.info("Found DOI", indent_level=1)
+    b.debug("Extracted 1 page", indent_level=1)
+    b.flush()
+    a.warning("Left open")
+
+    output = ListHandler()
+    output.setLevel(logging.INFO)
+    handler = GroupingHandler(output)
+    while not queue.empty():
+        handler.handle(queue.get())
+
+    # Groups are printed whole once they end, in the order they end
+    assert output.messages == ["Processing: b.pdf"]
+    a.flush()
+    handler.handle(queue.get())
+    assert output.messages == ["Processing: b.pdf", "Processing: a.pdf", "  > Found DOI", "Left open"]
+
+    # Records without a group go through right away, and unfinished groups on close
+    a.info("Unfinished")
+    handler.handle(queue.get())
+    handler.handle(logging.makeLogRecord({'msg': 'Ungrouped', 'levelno': logging.INFO}))
+    assert output.messages[-1] == "Ungrouped"
+    handler.close()
+    assert output.messages[-1] == "Unfinished"
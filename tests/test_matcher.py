@@ -0,0 +1,90 @@
+from prem import PDF
+from prem.sources import CrossRef, arXiv
+from prem.matcher import Matcher, matcher, group_values
+import os
+import pikepdf
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), 'helpers'))
+from helpers.utils import make_pdf
+
+def test_matcher_typed_hits():
+    text = "DOI 10.1038/nrn1907 and arXiv:2101.12345v2"
+    hits = matcher.find(text, 0)
+    assert [ (h.kind, h.value) for h in hits ] == [('doi', '10.1038/nrn1907'), ('arxiv', '2101.12345')]
+    assert text[hits[0].start:hits[0].end] == '10.1038/nrn1907'
+    assert hits[1].where == 0
+
+def test_matcher_reversed_arxiv_stamp():
+    text = "title\n]hp-peh[ 2v54321.1012:viXra\n"
+    assert group_values(matcher.find(text), ['arxiv']) == [['2101.12345']]
+
+def test_matcher_kinds():
+    m = Matcher()
+    m.register('doi', CrossRef.identifier_regex)
+    m.register('doi', CrossRef.identifier_regex_compiled)
+    m.register('pmid', r'(?<=PMID: )\d+')
+    assert m.kinds == ['doi', 'pmid']
+    assert [ h.value for h in m.find("PMID: 123 10.1038/nrn1907", kinds={'pmid'}) ] == ['123']
+
+def test_pdf_find_hits_in_text():
+    filename = make_pdf(['Title', 'DOI 10.1038/nrn1907 arXiv:2101.12345', 'DOI 10.1000/later', 'arXiv:1706.03762'])
+    pdf = PDF(filename)
+    hits = pdf.find_hits_in_text(matcher, n_pages=4)
+    assert group_values(hits, ['doi', 'arxiv']) == [['10.1038/nrn1907'], ['2101.12345']]
+    # Stops at the first page with any identifier
+    assert set(pdf.page_texts) == {0, 1}
+    os.remove(filename)
+
+def test_pdf_find_hits_in_text_single_kind():
+    # A paper with only a DOI, citing an arXiv paper in its references on the last page
+    texts = [ 'DOI 10.1038/nrn1907' ] + [ f"page {i}" for i in range(1, 11) ] + [ 'arXiv:1706.03762' ]
+    filename = make_pdf(texts)
+    pdf = PDF(filename)
+    hits = pdf.find_hits_in_text(matcher)
+    assert group_values(hits, ['doi', 'arxiv']) == [['10.1038/nrn1907'], []]
+    assert set(pdf.page_texts) == {0}
+    os.remove(filename)
+
+def test_pdf_find_hits_in_text_last_page():
+    front = [ f"page {i}" for i in range(11) ]
+
+    # A publisher footer on the last page, when the front pages have no identifier
+    filename = make_pdf(front + ['Conclusion. DOI 10.1038/nrn1907 arXiv:1706.03762'])
+    pdf = PDF(filename)
+    assert group_values(pdf.find_hits_in_text(matcher), ['doi', 'arxiv']) == [['10.1038/nrn1907'], []]
+    assert set(pdf.page_texts) == {0, 1, 2, 11}
+    assert pdf.find_hits_in_text(matcher, n_pages=3) == []
+    os.remove(filename)
+
+    # A reference list citing several papers
+    filename = make_pdf(front + ['[1] doi:10.1038/nrn1907 [2] doi:10.1103/PhysRevD.13.191'])
+    assert PDF(filename).find_hits_in_text(matcher) == []
+    os.remove(filename)
+
+def test_pdf_find_hits_in_metadata():
+    filename = make_pdf(['No identifiers here'])
+    pdf = PDF(filename)
+    pdf.update_metadata({'dc:identifier': 'doi:10.1038/nrn1907'})
+    hits = pdf.find_hits_in_metadata(matcher, [CrossRef.identifier_kind, arXiv.identifier_kind])
+    assert [ (h.kind, h.value, h.where) for h in hits ] == [('doi', '10.1038/nrn1907', 'xmp')]
+    os.remove(filename)
+
+def test_pdf_find_hits_in_raw_metadata():
+    filename = make_pdf(['No identifiers here'])
+    pdf = PDF(filename)
+    pdf.pdf.docinfo['/Subject'] = 'Published as arXiv:2101.12345'
+    # Stored as UTF-16
+    pdf.pdf.docinfo['/Title'] = pikepdf.String('Ωmega 10.1038/nrn1907')
+    hits = pdf.find_hits_in_metadata(matcher)
+    assert set(map(lambda h: (h.kind, h.value, h.where), hits)) == {('arxiv', '2101.12345', '/Subject'), ('doi', '10.1038/nrn1907', '/Title')}
+    # The XMP packet isn't parsed
+    assert pdf._metadata is None
+    os.remove(filename)
+
+def test_pdf_find_in_metadata_lists():
+    filename = make_pdf(['No identifiers here'])
+    pdf = PDF(filename)
+    pdf.update_metadata({'dc:subject': {'physics', 'doi:10.1038/nrn1907'}})
+    assert pdf.find_in_metadata(CrossRef.identifier_regex_compiled) == ['10.1038/nrn1907']
+    os.remove(filename)
@@ -0,0 +1,17 @@
+from prem import memory
+from multiprocessing import Pool
+
+def allocate(megabytes):
+    memory.limit(200)
+    try:
+        data = bytearray(megabytes * memory.MiB)
+        return len(data) // memory.MiB
+    except MemoryError:
+        memory.release()
+        return None
+
+def test_limit():
+    assert memory.rss() > 0
+    # The limit is set in fresh workers, so that it doesn't stay on the test process
+    with Pool(1, maxtasksperchild=1) as pool:
+        assert pool.map(allocate, [20, 1000, 20]) == [20, None, 20]
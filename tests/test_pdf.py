@@ -1,11 +1,12 @@
 from prem import PDF
 from prem.sources import CrossRef
+from prem.engines import ENGINES
 import os
 import sys
 
 # FIXME:
 sys.path.append(os.path.join(os.path.dirname(__file__), 'helpers'))
-from helpers.utils import get_pdf
+from helpers.utils import get_pdf, make_pdf
 
 def test_pdf_read():
     filename = get_pdf('neuroscience_education')
@@ -34,6 +35,36 @@ def test_pdf_to_text():
     assert text
     os.remove(filename)
 
+def test_pdf_page_texts_cached():
+    filename = make_pdf(['DOI 10.1038/nrn1907', 'second page', 'third page'])
+    pdf = PDF(filename)
+
+    assert pdf.find_in_text(CrossRef.identifier_regex_compiled) == ['10.1038/nrn1907']
+    assert list(pdf.page_texts) == [0]
+
+    # Later searches and full extraction reuse the already extracted pages
+    pdf.page_texts[0] = 'DOI 10.1103/PhysRevD.13.191'
+    assert pdf.find_in_text(CrossRef.identifier_regex_compiled) == ['10.1103/PhysRevD.13.191']
+    assert 'third page' in pdf.pages_to_text()
+    assert sorted(pdf.page_texts) == [0, 1, 2]
+    os.remove(filename)
+
+def test_pdf_find_in_text_early_exit():
+    texts = [ f"page {i}" for i in range(100) ]
+    texts[3] = 'DOI 10.1038/nrn1907'
+    texts[-1] = 'DOI 10.1103/PhysRevD.13.191'
+    filename = make_pdf(texts)
+    pdf = PDF(filename)
+
+    # Front matter only: the last page is the reference list. The budget grows with the page count.
+    assert pdf.scan_order() == [0, 1, 2, 3, 4]
+    assert pdf.scan_order(n_pages=2) == [0, 1]
+
+    assert pdf.find_in_text(CrossRef.identifier_regex_compiled) == ['10.1038/nrn1907']
+    assert sorted(pdf.page_texts) == [0, 1, 2, 3]
+
+    assert pdf.find_in_text(CrossRef.identifier_regex_compiled, n_pages=3) == []
+    os.remove(filename)
 
 def test_pdf_overwrite():
     filename = get_pdf('black_holes')
@@ -60,3 +91,111 @@ def test_pdf_rename():
 
     os.remove(newfilename)
 
+
+def test_pdf_rename_incremental():
+    filename = make_pdf(['DOI 10.1038/nrn1907'])
+    newfilename = filename + '.new.pdf'
+    with open(filename, 'rb') as fp:
+        original = fp.read()
+
+    pdf = PDF(filename)
+    pdf.update_metadata({'dc:title': 'Neuroscience and education'})
+    pdf.rename(newfilename)
+    assert not os.path.exists(filename)
+
+    # The original bytes are kept untouched and the update is appended
+    with open(newfilename, 'rb') as fp:
+        assert fp.read().startswith(original)
+
+    pdf2 = PDF(newfilename)
+    assert pdf2.metadata['dc:title'] == 'Neuroscience and education'
+    assert str(pdf2.pdf.docinfo.Title) == 'Neuroscience and education'
+    assert 'nrn1907' in pdf2.pages_to_text()
+    os.remove(newfilename)
+
+def test_pdf_rename_full_rewrite():
+    filename = make_pdf(['DOI 10.1038/nrn1907', 'Second page'])
+    os.chmod(filename, 0o640)
+
+    with PDF(filename, incremental=False) as pdf:
+        pdf.update_metadata({'dc:title': 'Neuroscience and education'})
+        pdf.rename(filename)
+
+    # The input is replaced by a temporary file with the same permissions
+    assert os.stat(filename).st_mode & 0o777 == 0o640
+    assert not os.path.exists(filename + '.prem-save')
+    with PDF(filename) as pdf2:
+        assert pdf2.metadata['dc:title'] == 'Neuroscience and education'
+        assert 'Second page' in pdf2.page_to_text(1)
+    os.remove(filename)
+
+def test_pdf_rename_trailing_garbage():
+    filename = make_pdf(['DOI 10.1038/nrn1907'])
+    with open(filename, 'ab') as fp:
+        fp.write(b'\n<html>download page</html>\n' * 100)
+
+    # No update can be appended after the junk: the whole file is rewritten
+    with PDF(filename) as pdf:
+        assert pdf.last_xref()[1] is None and not pdf.can_append()
+        pdf.update_metadata({'dc:title': 'Neuroscience and education'})
+        pdf.rename(filename)
+
+    with PDF(filename) as pdf2:
+        assert pdf2.metadata['dc:title'] == 'Neuroscience and education'
+        assert not pdf2.repaired and pdf2.can_append()
+    os.remove(filename)
+
+def test_pdf_rename_repaired():
+    filename = make_pdf(['DOI 10.1038/nrn1907'])
+    with open(filename, 'rb') as fp:
+        data = fp.read()
+    # The last cross-reference section is at another offset
+    with open(filename, 'wb') as fp:
+        fp.write(data[:data.rindex(b'startxref')] + b'startxref\n12\n%%EOF\n')
+
+    with PDF(filename) as pdf:
+        assert pdf.repaired and not pdf.can_append()
+        pdf.update_metadata({'dc:title': 'Neuroscience and education'})
+        pdf.rename(filename)
+
+    with PDF(filename) as pdf2:
+        assert pdf2.metadata['dc:title'] == 'Neuroscience and education'
+        assert not pdf2.repaired
+    os.remove(filename)
+
+def test_pdf_engines():
+    filename = make_pdf(['Title page', 'DOI 10.1038/nrn1907'])
+    pdf = PDF(filename)
+    for engine in ENGINES:
+        assert 'nrn1907' in pdf.pages_to_text(engine=engine)
+        assert pdf.extraction_times[engine][0] == 2
+    assert set(pdf.texts) == set(ENGINES)
+    pdf.unload()
+    os.remove(filename)
+
+def test_pdf_context_manager():
+    filename = make_pdf([f"Page {i}" for i in range(6)])
+    with PDF(filename) as pdf:
+        # Pages are read out of order, as identifier searches do
+        assert 'Page 5' in pdf.page_to_text(5)
+        assert 'Page 1' in pdf.page_to_text(1)
+        assert 'Page 2' in pdf.page_to_text(2)
+        engine = pdf.engines['pdfminer']
+    assert pdf.pdf is None and pdf.engines == {} and engine.fp.closed
+    pdf.unload()
+    os.remove(filename)
+
+def test_pdf_guess_title(tmp_path):
+    from pikepdf import Pdf, Dictionary, Name
+    filename = str(tmp_path / 'title.pdf')
+    pdf = Pdf.new()
+    page = pdf.add_blank_page(page_size=(612, 792))
+    page.Resources = Dictionary(Font=Dictionary(F1=Dictionary(Type=Name.Font, Subtype=Name.Type1, BaseFont=Name.Helvetica)))
+    page.Contents = pdf.make_stream(b"BT /F1 40 Tf 72 740 Td (A) Tj ET "
+                                    b"BT /F1 20 Tf 72 700 Td (Neuroscience and education) Tj ET "
+                                    b"BT /F1 10 Tf 72 600 Td (Usha Goswami, University of Cambridge) Tj ET")
+    pdf.save(filename)
+
+    # The drop cap is too short to be a title
+    with PDF(filename) as pdf:
+        assert pdf.guess_title() == 'Neuroscience and education'
@@ -0,0 +1,54 @@
+from prem import profile
+import json
+import pytest
+
+@pytest.fixture
+def enabled():
+    profile.enable()
+    yield
+    profile.enable(False)
+
+def test_span_disabled():
+    profile.start()
+    with profile.span('stage', page=0) as span:
+        span.set(hit=True)
+    assert span is profile.NULL_SPAN
+    assert profile.stop() == []
+
+def test_spans(enabled):
+    @profile.profiled('decorated')
+    def square(x):
+        return x * x
+
+    # Spans outside start/stop are not collected
+    with profile.span('ignored'):
+        pass
+
+    profile.start()
+    with profile.span('outer', page=1) as span:
+        assert square(3) == 9
+        span.set(hit=False)
+    spans = profile.stop()
+
+    assert [ (name, attrs) for name, _, attrs in spans ] == [('decorated', {}), ('outer', {'page': 1, 'hit': False})]
+    assert spans[1][1] >= spans[0][1]
+    assert profile.stop() == []
+
+def test_report(tmp_path):
+    trace = tmp_path / 'trace.jsonl'
+    report = profile.Report()
+    report.open_trace(trace)
+    report.add('a.pdf', [('driver', 0.5, {}), ('cache.crossref', 0.1, {'hit': True})])
+    report.add('b.pdf', [('driver', 1.5, {}), ('cache.crossref', 0.1, {'hit': False}), ('cache.crossref', 0.1, {'hit': True})])
+    report.add('c.pdf', [])
+    report.close()
+
+    header, driver, cache = report.table()
+    assert header.split()[0] == 'stage'
+    assert driver.split() == ['driver', '2', '2.000', '500.00', '1500.00', '1500.00']
+    assert cache.split()[0] == 'cache.crossref' and cache.split()[-1] == '67'
+
+    lines = list(map(json.loads, trace.read_text().splitlines()))
+    assert [ line['file'] for line in lines ] == ['a.pdf', 'b.pdf']
+    assert lines[1]['total'] == 1.5
+    assert lines[0]['spans'][1] == {'name': 'cache.crossref', 'ms': 100.0, 'hit': True}
@@ -0,0 +1,29 @@
+from prem.sources import sources
+from prem.sources import CrossRef, CrossRefDump
+import subprocess
+import sys
+
+def test_sources():
+    assert list(sources) == ['arxiv', 'crossref', 'crossrefdump']
+    assert 'crossref-dump' in sources and 'CrossRef' in sources and 'doi' not in sources
+    assert sources['crossref-dump'] is CrossRefDump
+    assert sources['crossref'].identifier_kind == CrossRef.identifier_kind
+
+def test_lazy_imports():
+    """
+    Importing prem, and logging without output, loads none of the heavy dependencies
+    """
+    code = """
+import sys
+import prem
+from prem import PDF
+from prem.sources import sources
+from prem.bibtex import BibWriter
+from prem.logging import defaultLogger
+from prem.engines import ENGINES
+sources['crossref']
+heavy = ['pikepdf', 'pdfplumber', 'pdfminer', 'requests', 'rich', 'lxml', 'pyfzf', 'click']
+print(' '.join(name for name in heavy if name in sys.modules))
+"""
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ''
@@ -0,0 +1,28 @@
+from prem.sqlite import SQLiteStore
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import get_context
+
+class Store(SQLiteStore):
+    def setup(self, db):
+        db.execute('CREATE TABLE IF NOT EXISTS items (value INTEGER)')
+
+# Inherited by forked workers
+store = None
+
+def add(value):
+    store.db.execute('INSERT INTO items VALUES (?)', (value,))
+    return id(store.db)
+
+def test_sqlite_store(tmp_path):
+    global store
+    store = Store(str(tmp_path / 'sub' / 'store.sqlite'))
+    assert store.db is store.db
+    assert store.db.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+    # One connection per thread, and a new one in forked processes
+    with ThreadPoolExecutor(2) as executor:
+        connections = set(executor.map(add, [1, 2]))
+    with get_context('fork').Pool(2) as pool:
+        pool.map(add, [3, 4])
+    assert id(store.db) not in connections
+    assert sorted(row[0] for row in store.db.execute('SELECT value FROM items')) == [1, 2, 3, 4]
@@ -0,0 +1,37 @@
+import pytest
+from prem import titles
+from multiprocessing import Pool
+
+def test_normalize():
+    assert titles.normalize('  Deep-Learning: a Survey?\n') == 'deep learning a survey'
+    assert titles.normalize(None) == ''
+
+def test_similarity():
+    assert titles.similarity('Deep Learning: A Survey', 'deep learning a survey') == 1
+    assert titles.similarity('Deep Learning', 'Deep Learnign') > 0.9
+    assert titles.similarity('Deep Learning', 'Black holes and thermodynamics') < 0.5
+
+def test_score():
+    text = 'Black holes and thermodynamics\nS. W. Hawking\nReceived 1975'
+    assert titles.score('Black holes and thermodynamics', text, ['Black Holes and Thermodynamics'], ['Hawking'], 1975) == pytest.approx(1)
+    assert round(titles.score('Black holes and thermodynamics', text, ['Black Holes and Thermodynamics'], ['Penrose'], 1975), 2) == 0.8
+    assert round(titles.score('Black holes and thermodynamics', text, ['Other', 'Black holes and thermodynamics'], [], None), 2) == 0.7
+    assert titles.score('Black holes', text, [], ['Hawking'], 1975) == pytest.approx(0.3)
+
+def queue(args):
+    titles.queue_for_review(*args)
+
+def test_queue_for_review(tmp_path):
+    review = str(tmp_path / 'review.txt')
+    with Pool(4) as pool:
+        pool.map(queue, [ (str(tmp_path / f"{n}.pdf"), review) for n in range(20) ])
+    lines = open(review).read().splitlines()
+    assert sorted(lines) == sorted(str(tmp_path / f"{n}.pdf") for n in range(20))
+
+def test_queue_for_review_once(tmp_path):
+    review = str(tmp_path / 'review.txt')
+    with Pool(4) as pool:
+        pool.map(queue, [ (str(tmp_path / f"{n % 3}.pdf"), review) for n in range(12) ])
+    titles.queue_for_review(str(tmp_path / '0.pdf'), review)
+    lines = open(review).read().splitlines()
+    assert sorted(lines) == sorted(str(tmp_path / f"{n}.pdf") for n in range(3))
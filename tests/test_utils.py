@@ -4,3 +4,16 @@ import os
 # FIXME:
 sys.path.append(os.path.join(os.path.dirname(__file__), 'helpers'))
 from helpers.utils import get_pdf
+from helpers.stub_server import StubServer, crossref_record
+from prem.cache import MetadataCache
+import prem.cache
+import prem.utils
+
+def test_fetch_bibliography(tmp_path, monkeypatch):
+    monkeypatch.setattr(prem.cache, 'cache', MetadataCache(str(tmp_path / 'cache.sqlite')))
+    with StubServer({'10.1038/nrn1907': crossref_record('10.1038/nrn1907', family='Goswami', year=2006)}) as stub:
+        monkeypatch.setattr(prem.utils, 'DOI_RESOLVER', stub.url)
+        bib = prem.utils.fetch_bibliography('10.1038/nrn1907')
+        assert bib.startswith('@article{GoswamiGoswami_2006,')
+        assert prem.utils.fetch_bibliography('10.1038/NRN1907') == bib
+        assert len(stub.requests) == 1
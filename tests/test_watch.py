@@ -0,0 +1,77 @@
+from prem.watch import is_candidate, Debouncer, InotifyWatcher, PollingWatcher, watch, SubmitServer, submit
+from threading import Thread
+import pytest
+import time
+
+def test_is_candidate():
+    assert is_candidate('/downloads/paper.pdf')
+    assert is_candidate('Paper.PDF')
+    assert not is_candidate('paper.pdf.part')
+    assert not is_candidate('paper.pdf.crdownload')
+    assert not is_candidate('.paper.pdf')
+    assert not is_candidate('notes.txt')
+
+def test_debouncer(tmp_path):
+    debouncer = Debouncer(settle=0.2)
+    path = tmp_path / 'paper.pdf'
+    path.write_bytes(b'%PDF-1.4 partial')
+    debouncer.touch(str(path))
+    assert debouncer.due() == [] and 0 < debouncer.next_timeout() <= 0.2
+
+    # Still growing: waits for another settle time
+    time.sleep(0.1)
+    path.write_bytes(b'%PDF-1.4 partial and more')
+    time.sleep(0.15)
+    assert debouncer.due() == []
+    time.sleep(0.25)
+    assert debouncer.due() == [str(path)]
+    assert debouncer.next_timeout() is None
+
+    # Files that disappear are dropped
+    debouncer.touch(str(path))
+    path.unlink()
+    time.sleep(0.25)
+    assert debouncer.due() == [] and not debouncer.pending
+
+@pytest.mark.parametrize('poll', [None, 0.1])
+def test_watch(tmp_path, poll):
+    (tmp_path / 'old.pdf').write_bytes(b'%PDF-1.4 old')
+    files = watch([str(tmp_path)], settle=0.2, poll=poll)
+    found = []
+    thread = Thread(target=lambda: found.append(next(files)), daemon=True)
+    thread.start()
+    time.sleep(0.3)
+
+    (tmp_path / 'new.pdf.part').write_bytes(b'%PDF-1.4 new')
+    (tmp_path / 'new.pdf.part').rename(tmp_path / 'new.pdf')
+    (tmp_path / 'notes.txt').write_text('not a pdf')
+    thread.join(5)
+    assert found == [str(tmp_path / 'new.pdf')]
+
+def test_inotify_events(tmp_path):
+    watcher = InotifyWatcher([str(tmp_path)])
+    (tmp_path / 'a.pdf').write_bytes(b'%PDF')
+    assert watcher.events(1) == [str(tmp_path / 'a.pdf')]
+    assert watcher.events(0.1) == []
+    watcher.close()
+
+def test_submit(tmp_path):
+    socket_file = str(tmp_path / 'prem.sock')
+    process = lambda files: ({'file': f, 'ok': f.endswith('.pdf')} for f in files)
+    server = SubmitServer(socket_file, process)
+    Thread(target=server.serve_forever, daemon=True).start()
+
+    # Only one server per socket
+    with pytest.raises(RuntimeError):
+        SubmitServer(socket_file, process)
+
+    results = list(submit(['/a.pdf', '/b.txt'], socket_file))
+    assert results == [{'file': '/a.pdf', 'ok': True}, {'file': '/b.txt', 'ok': False}]
+    server.shutdown()
+    server.server_close()
+
+    # The socket of a server that is gone is replaced
+    stale = SubmitServer(socket_file, process)
+    stale.socket.close()
+    server = SubmitServer(socket_file, process)
+    server.server_close()